@@ -6,7 +6,9 @@ script then creates in HDX.
 """
 
 import logging
+import os
 from os.path import expanduser, join
+from typing import Dict, Tuple
 
 from hdx.api.configuration import Configuration
 from hdx.data.dataset import Dataset
@@ -21,8 +23,20 @@ from hdx.utilities.path import (
 from hdx.utilities.retriever import Retrieve
 
 from hdx.scraper.chc_ucsb._version import __version__
+from hdx.scraper.chc_ucsb.bandwidth import BandwidthGovernor
+from hdx.scraper.chc_ucsb.metrics import MetricsStore, RetryCounter, RunMetrics
 from hdx.scraper.chc_ucsb.pipeline import Pipeline
+from hdx.scraper.chc_ucsb.profiling import ResourceSampler
+from hdx.scraper.chc_ucsb.publish import (
+    diff_dataset_metadata,
+    finalise_resources,
+    log_metadata_diff,
+)
+from hdx.scraper.chc_ucsb.report import RunReport
+from hdx.scraper.chc_ucsb.scheduler import load_previous_report
+from hdx.scraper.chc_ucsb.shards import get_shard_report_path, shard_units
 from hdx.scraper.chc_ucsb.tiff_download import TIFFDownload
+from hdx.scraper.chc_ucsb.verify import ResourceVerifier, get_failed_units
 
 # setup_logging("DEBUG")
 logger = logging.getLogger(__name__)
@@ -32,20 +46,38 @@ _SAVED_DATA_DIR = "saved_data"  # Keep in repo to avoid deletion in /tmp
 _UPDATED_BY_SCRIPT = "HDX Scraper: CHC UCSB"
 
 
-def create_resource_in_hdx(resource: Resource, dataset: Dataset) -> Resource:
-    resource.create_in_hdx(dataset=dataset)
-    return resource
+def create_resource_in_hdx(
+    resource: Resource, dataset: Dataset
+) -> Tuple[Resource, int]:
+    # Match an existing resource by name here as hdx-python-api treats a match
+    # with the dataset's first resource as no match and would add a duplicate
+    if not resource.get("id"):
+        for existing_resource in dataset.get_resources():
+            if existing_resource["name"] == resource["name"]:
+                resource["id"] = existing_resource["id"]
+                break
+    status = resource.create_in_hdx(dataset=dataset)
+    return resource, status
 
 
 def main(
     save: bool = False,
     use_saved: bool = False,
+    shard_index: int = 0,
+    shard_count: int = 1,
 ) -> None:
-    """Generate datasets and create them in HDX
+    """Generate datasets and create them in HDX. With more than one shard, only
+    this shard's share of the (variable, scenario, product, month) units of the
+    work graph is processed,
+    resources are uploaded into datasets already created by running the merge
+    module with --prepare and a shard report is written for the merge module to
+    combine.
 
     Args:
         save (bool): Save downloaded data. Defaults to False.
         use_saved (bool): Use saved data. Defaults to False.
+        shard_index (int): Index of shard from 0. Defaults to 0.
+        shard_count (int): Number of shards. Defaults to 1.
 
     Returns:
         None
@@ -55,15 +87,6 @@ def main(
     User.check_current_user_write_access("6e30eb6d-52f9-49de-b2cd-2d68fced05c5")
 
     with wheretostart_tempdir_batch(folder=_LOOKUP) as info:
-
-        def create_dataset_in_hdx(dataset: Dataset) -> Dataset:
-            dataset.create_in_hdx(
-                hxl_update=False,
-                updated_by_script=_UPDATED_BY_SCRIPT,
-                batch=info["batch"],
-            )
-            return dataset
-
         tempdir = info["folder"]
         with Download() as downloader:
             retriever = Retrieve(
@@ -74,32 +97,190 @@ def main(
                 save=save,
                 use_saved=use_saved,
             )
-            tiff_download = TIFFDownload()
-            pipeline = Pipeline(tiff_download, configuration, retriever, tempdir)
-
-            for scenario in configuration["scenarios"]:
-                dataset = pipeline.generate_dataset(scenario)
-                dataset.update_from_yaml(
-                    script_dir_plus_file(
-                        join("config", "hdx_dataset_static.yaml"), main
-                    )
-                )
-                resource_ids = pipeline.add_resources(
-                    dataset, scenario, create_dataset_in_hdx, create_resource_in_hdx
+            governor = BandwidthGovernor.from_configuration(configuration, shard_count)
+            rsync_logging = configuration.get("rsync_logging", {})
+            tiff_download = TIFFDownload(
+                governor,
+                rsync_logging.get("mode", "full"),
+                rsync_logging.get("buffer_lines", 1000),
+                rsync_logging.get("tail_lines", 50),
+                rsync_logging.get("sample_every", 0),
+            )
+            report = RunReport(shard_index, shard_count)
+            previous_report = load_previous_report(configuration["run_report_dir"])
+            metrics = RunMetrics()
+            retry_counter = RetryCounter()
+            session = configuration.remoteckan().session
+            session.hooks["response"].append(retry_counter.hook)
+            profiling = configuration.get("profiling", {})
+            if profiling.get("enabled"):
+                sampler = ResourceSampler(tempdir, profiling["interval_seconds"])
+                sampler.start()
+            else:
+                sampler = None
+            try:
+                pipeline = Pipeline(
+                    tiff_download,
+                    configuration,
+                    retriever,
+                    tempdir,
+                    report,
+                    previous_report,
+                    governor,
+                    metrics,
+                    sampler,
                 )
-                dataset = Dataset.read_from_hdx(dataset["name"])
-                new_resources = [
-                    r for r in dataset.get_resources() if r["id"] in resource_ids
-                ]
-                dataset.init_resources()
-                dataset.add_update_resources(new_resources, ignore_datasetid=True)
-                dataset.create_in_hdx(
-                    remove_additional_resources=True,
-                    hxl_update=False,
-                    updated_by_script=_UPDATED_BY_SCRIPT,
-                    batch=info["batch"],
+                verification = configuration.get("verification", {})
+                if verification.get("enabled"):
+                    verifier = ResourceVerifier(
+                        configuration, verification.get("max_workers", 8)
+                    )
+                else:
+                    verifier = None
+                work_graph = pipeline.get_work_graph()
+                shard = shard_units(work_graph, shard_index, shard_count)
+
+                for variable, scenario in work_graph.get_datasets():
+                    units = shard.get((variable, scenario))
+                    if not units:
+                        continue
+                    retries = retry_counter.count
+                    dataset = pipeline.generate_dataset(variable, scenario)
+                    dataset.update_from_yaml(
+                        script_dir_plus_file(
+                            join("config", "hdx_dataset_static.yaml"), main
+                        )
+                    )
+                    live_dataset = Dataset.read_from_hdx(dataset["name"])
+                    if shard_count > 1:
+                        # Shards only add resources as metadata is written by prepare
+                        if live_dataset is None:
+                            raise ValueError(
+                                f"Dataset {dataset['name']} does not exist. Run merge with --prepare first!"
+                            )
+                        metadata_unchanged = True
+                    else:
+                        changes = diff_dataset_metadata(dataset, live_dataset)
+                        log_metadata_diff(dataset["name"], changes)
+                        metadata_unchanged = live_dataset is not None and not changes
+                    if live_dataset is None:
+                        live_resource_ids = None
+                    else:
+                        live_resource_ids = [
+                            r["id"] for r in live_dataset.get_resources()
+                        ]
+
+                    def create_dataset_in_hdx(
+                        dataset: Dataset,
+                    ) -> Tuple[Dataset, Dict[str, int]]:
+                        if metadata_unchanged:
+                            # Only the resources need uploading into the existing dataset
+                            dataset["id"] = live_dataset["id"]
+                            statuses = {}
+                            for resource in dataset.get_resources():
+                                _, status = create_resource_in_hdx(
+                                    resource, live_dataset
+                                )
+                                statuses[resource["name"]] = status
+                            # Later resources are matched against the live resources
+                            return live_dataset, statuses
+                        statuses = dataset.create_in_hdx(
+                            hxl_update=False,
+                            updated_by_script=_UPDATED_BY_SCRIPT,
+                            batch=info["batch"],
+                        )
+                        return dataset, statuses
+
+                    resource_ids = pipeline.add_resources(
+                        dataset,
+                        variable,
+                        scenario,
+                        create_dataset_in_hdx,
+                        create_resource_in_hdx,
+                        units,
+                    )
+                    if verifier:
+                        failures = verifier.verify(report.get_units(variable, scenario))
+                        failed_units = get_failed_units(failures)
+                        if failed_units and verification.get("requeue"):
+                            logger.warning(
+                                f"Re-uploading {len(failed_units)} units of {dataset['name']}"
+                            )
+
+                            def create_requeued_in_hdx(
+                                requeued_dataset: Dataset,
+                            ) -> Tuple[Dataset, Dict[str, int]]:
+                                requeued_live_dataset = Dataset.read_from_hdx(
+                                    dataset["name"]
+                                )
+                                statuses = {}
+                                for resource in requeued_dataset.get_resources():
+                                    _, status = create_resource_in_hdx(
+                                        resource, requeued_live_dataset
+                                    )
+                                    statuses[resource["name"]] = status
+                                return requeued_live_dataset, statuses
+
+                            pipeline.add_resources(
+                                pipeline.generate_dataset(variable, scenario),
+                                variable,
+                                scenario,
+                                create_requeued_in_hdx,
+                                create_resource_in_hdx,
+                                failed_units,
+                            )
+                            failures = verifier.verify(
+                                [
+                                    unit
+                                    for unit in report.get_units(variable, scenario)
+                                    if (unit["product"], unit["month"]) in failed_units
+                                ]
+                            )
+                            resource_ids = [
+                                resource["id"]
+                                for unit in report.get_units(variable, scenario)
+                                for resource in unit["resources"]
+                            ]
+                        report.set_verification(dataset["name"], failures)
+                    if shard_count == 1:
+                        finalise_resources(
+                            dataset["name"],
+                            resource_ids,
+                            metadata_unchanged,
+                            live_resource_ids,
+                            _UPDATED_BY_SCRIPT,
+                            info["batch"],
+                        )
+                    metrics.add_retries(
+                        variable, scenario, "upload", retry_counter.count - retries
+                    )
+
+                report.data["bandwidth"] = governor.get_utilisation()
+            finally:
+                session.hooks["response"].remove(retry_counter.hook)
+                # Export resource samples even if the run fails as those are the
+                # runs they are most needed to diagnose
+                if sampler:
+                    sampler.stop()
+                    sampler.save_csv(profiling["csv_file"])
+                    sampler.save_prometheus(profiling["prometheus_file"])
+                    report.data["resource_peaks"] = sampler.get_peaks()
+                # Failed runs are recorded too as they are often the slow ones.
+                # Shards of a run share the GitHub Actions run id so that they are
+                # compared as one run.
+                MetricsStore(configuration["metrics"]["history_file"]).append(
+                    metrics,
+                    run_id=os.getenv("GITHUB_RUN_ID") or info["batch"],
+                    shard_index=shard_index,
+                    shard_count=shard_count,
                 )
 
+    report_dir = configuration["run_report_dir"]
+    if shard_count > 1:
+        report.save(get_shard_report_path(report_dir, shard_index, shard_count))
+    else:
+        report.save(join(report_dir, "run_report.json"))
+
 
 if __name__ == "__main__":
     facade(
@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional
+
+from hdx.scraper.chc_ucsb.staging import link_or_copy
+
+logger = logging.getLogger(__name__)
+
+
+class ArtifactCache:
+    """ArtifactCache class that keeps built artifacts on local disk keyed by a hash
+    of the manifest of their input files and evicts the least recently used ones
+    once the total size exceeds a cap"""
+
+    def __init__(self, directory: str, max_size: int, suffix: str = ".zip"):
+        """ArtifactCache constructor
+
+        Args:
+            directory (str): Cache directory
+            max_size (int): Maximum total size of cached artifacts in bytes
+            suffix (str): Suffix of cached artifacts. Defaults to ".zip".
+        """
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._max_size = max_size
+        self._suffix = suffix
+
+    @staticmethod
+    def key(input_directory: Path, *extra: str) -> str:
+        """Get cache key from the relative names, sizes and modification times of
+        all files under the input directory plus any extra strings (eg. build
+        settings) that change the artifact
+
+        Args:
+            input_directory (Path): Directory of input files
+            *extra (str): Extra strings to include in key
+
+        Returns:
+            str: Cache key
+        """
+        manifest = []
+        for path in sorted(Path(input_directory).rglob("*")):
+            if not path.is_file():
+                continue
+            stat = path.stat()
+            relative_path = path.relative_to(input_directory).as_posix()
+            manifest.append(f"{relative_path}\t{stat.st_size}\t{stat.st_mtime_ns}")
+        manifest.extend(extra)
+        return hashlib.sha256("\n".join(manifest).encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self._directory.joinpath(f"{key}{self._suffix}")
+
+    def get(self, key: str, output_path: str) -> bool:
+        """Put cached artifact for key at output path if there is one, marking it
+        as most recently used
+
+        Args:
+            key (str): Cache key
+            output_path (str): Path at which to place artifact
+
+        Returns:
+            bool: Whether there was a cached artifact
+        """
+        cached_path = self._path(key)
+        if not cached_path.exists():
+            return False
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        link_or_copy(cached_path, output_path)
+        os.utime(cached_path)
+        logger.info(f"Using cached artifact {cached_path} for {output_path}")
+        return True
+
+    def put(self, key: str, input_path: str) -> None:
+        """Add artifact at input path to cache under key and evict least recently
+        used artifacts if cache is over its size cap
+
+        Args:
+            key (str): Cache key
+            input_path (str): Path of artifact
+
+        Returns:
+            None
+        """
+        cached_path = self._path(key)
+        if not cached_path.exists():
+            temp_path = cached_path.with_name(f"{cached_path.name}.tmp")
+            link_or_copy(input_path, temp_path)
+            temp_path.replace(cached_path)
+        os.utime(cached_path)
+        self.evict(keep=[cached_path])
+
+    def evict(self, keep: Optional[List[Path]] = None) -> List[Path]:
+        """Remove least recently used artifacts until total size is within cap
+
+        Args:
+            keep (Optional[List[Path]]): Paths never to evict. Defaults to None.
+
+        Returns:
+            List[Path]: Evicted paths
+        """
+        entries = []
+        total_size = 0
+        for path in self._directory.glob(f"*{self._suffix}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # Evicted by another thread
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+        evicted = []
+        for _, size, path in sorted(entries):
+            if total_size <= self._max_size:
+                break
+            if keep and path in keep:
+                continue
+            path.unlink(missing_ok=True)
+            total_size -= size
+            evicted.append(path)
+            logger.info(f"Evicted {path} from artifact cache")
+        return evicted
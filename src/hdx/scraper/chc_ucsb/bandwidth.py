@@ -0,0 +1,211 @@
+import logging
+from collections import deque
+from math import ceil
+from threading import Lock
+from time import monotonic, sleep
+from typing import Dict, Optional
+
+from hdx.api.configuration import Configuration
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """TokenBucket class that limits the average rate at which bytes are consumed.
+    Consumers may take more tokens than are available in which case they wait for
+    the deficit, so transfers larger than the bucket capacity are allowed and later
+    consumers wait behind them. Bytes consumed are also metered over a sliding
+    window for reporting utilisation."""
+
+    def __init__(
+        self,
+        rate: Optional[float],
+        capacity: Optional[float] = None,
+        window: float = 60.0,
+    ):
+        """TokenBucket constructor
+
+        Args:
+            rate (Optional[float]): Bytes per second or None for unlimited
+            capacity (Optional[float]): Maximum burst in bytes. Defaults to rate.
+            window (float): Seconds over which to meter utilisation. Defaults to 60.
+        """
+        self._rate = rate
+        self._capacity = capacity if capacity is not None else rate
+        self._tokens = self._capacity
+        self._window = window
+        self._last = monotonic()
+        self._history = deque()
+        self._total = 0
+        self._lock = Lock()
+
+    @property
+    def rate(self) -> Optional[float]:
+        return self._rate
+
+    def consume(self, amount: int, allowance: float = 0.0) -> float:
+        """Take amount tokens waiting if the bucket does not have enough. Bytes
+        covered by allowance are metered but not taken, for transfers that have
+        already been paced at the limit by another means.
+
+        Args:
+            amount (int): Number of bytes
+            allowance (float): Bytes not to take from the bucket. Defaults to 0.
+
+        Returns:
+            float: Seconds waited
+        """
+        with self._lock:
+            now = monotonic()
+            self._history.append((now, amount))
+            self._total += amount
+            if self._rate is None:
+                return 0.0
+            self._tokens = min(
+                self._capacity, self._tokens + (now - self._last) * self._rate
+            )
+            self._last = now
+            self._tokens -= max(0.0, amount - allowance)
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+        if wait:
+            sleep(wait)
+        return wait
+
+    def get_utilisation(self) -> Dict:
+        """Get bytes consumed in total and over the window and the rate over the
+        window as a fraction of the limit
+
+        Returns:
+            Dict: Utilisation
+        """
+        with self._lock:
+            now = monotonic()
+            while self._history and self._history[0][0] < now - self._window:
+                self._history.popleft()
+            window_bytes = sum(amount for _, amount in self._history)
+            total = self._total
+        rate = window_bytes / self._window
+        return {
+            "total_bytes": total,
+            "window_bytes": window_bytes,
+            "bytes_per_second": rate,
+            "limit_bytes_per_second": self._rate,
+            "utilisation": rate / self._rate if self._rate else None,
+        }
+
+
+class BandwidthGovernor:
+    """BandwidthGovernor class shared by downloads and uploads for the whole run
+    with separate ingress and egress token buckets. rsync enforces its share of the
+    ingress budget itself using --bwlimit and only the bytes it fetched beyond its
+    share for the duration of the transfer are then taken from the ingress bucket
+    so that any overshoot delays the next transfer.
+    Uploads that sent a file take its size from the egress bucket after they
+    finish so that the next upload waits for any overshoot."""
+
+    def __init__(
+        self,
+        ingress_rate: Optional[float] = None,
+        egress_rate: Optional[float] = None,
+        burst_seconds: float = 1.0,
+        max_transfers: int = 1,
+    ):
+        """BandwidthGovernor constructor
+
+        Args:
+            ingress_rate (Optional[float]): Download bytes per second. Defaults to None (unlimited).
+            egress_rate (Optional[float]): Upload bytes per second. Defaults to None (unlimited).
+            burst_seconds (float): Seconds of transfer allowed in a burst. Defaults to 1.
+            max_transfers (int): Maximum concurrent transfers. Defaults to 1.
+        """
+        self.ingress = TokenBucket(
+            ingress_rate, ingress_rate * burst_seconds if ingress_rate else None
+        )
+        self.egress = TokenBucket(
+            egress_rate, egress_rate * burst_seconds if egress_rate else None
+        )
+        self._max_transfers = max_transfers
+
+    @classmethod
+    def from_configuration(
+        cls, configuration: Configuration, shard_count: int = 1
+    ) -> "BandwidthGovernor":
+        """Create BandwidthGovernor from the bandwidth section of the project
+        configuration. The budgets are for the whole series so each of shard_count
+        shards running in parallel gets an equal share.
+
+        Args:
+            configuration (Configuration): HDX configuration
+            shard_count (int): Number of shards. Defaults to 1.
+
+        Returns:
+            BandwidthGovernor: Bandwidth governor
+        """
+        bandwidth = configuration.get("bandwidth", {})
+        scheduling = configuration.get("scheduling", {})
+        ingress_rate = bandwidth.get("ingress_bytes_per_second")
+        egress_rate = bandwidth.get("egress_bytes_per_second")
+        return cls(
+            ingress_rate / shard_count if ingress_rate else None,
+            egress_rate / shard_count if egress_rate else None,
+            bandwidth.get("burst_seconds", 1.0),
+            scheduling.get("max_workers", 1),
+        )
+
+    def get_rsync_bwlimit(self) -> Optional[int]:
+        """Get --bwlimit in KiB per second for one rsync, which is an equal share of
+        the ingress budget between the maximum number of concurrent transfers
+
+        Returns:
+            Optional[int]: KiB per second or None if unlimited
+        """
+        if not self.ingress.rate:
+            return None
+        return max(1, ceil(self.ingress.rate / self._max_transfers / 1024))
+
+    def throttle_download(self, nbytes: int, seconds: float = 0.0) -> float:
+        """Account for downloaded bytes waiting if over budget. A transfer paced by
+        rsync --bwlimit was already held to its share of the budget while it ran,
+        so only bytes beyond that share over seconds are charged.
+
+        Args:
+            nbytes (int): Number of bytes downloaded
+            seconds (float): Duration of the transfer. Defaults to 0.
+
+        Returns:
+            float: Seconds waited
+        """
+        if not self.ingress.rate:
+            return self.ingress.consume(nbytes)
+        allowance = self.ingress.rate / self._max_transfers * seconds
+        return self.ingress.consume(nbytes, allowance)
+
+    def throttle_upload(self, nbytes: int) -> float:
+        """Account for uploaded bytes waiting if over budget
+
+        Args:
+            nbytes (int): Number of bytes uploaded
+
+        Returns:
+            float: Seconds waited
+        """
+        return self.egress.consume(nbytes)
+
+    def get_utilisation(self) -> Dict:
+        """Get current ingress and egress utilisation
+
+        Returns:
+            Dict: Utilisation by direction
+        """
+        return {
+            "ingress": self.ingress.get_utilisation(),
+            "egress": self.egress.get_utilisation(),
+        }
+
+    def log_utilisation(self) -> None:
+        for direction, utilisation in self.get_utilisation().items():
+            limit = utilisation["limit_bytes_per_second"]
+            limit = f"{limit:.0f}" if limit else "unlimited"
+            logger.info(
+                f"Bandwidth {direction}: {utilisation['bytes_per_second']:.0f} bytes/s of {limit}, {utilisation['total_bytes']} bytes in total"
+            )
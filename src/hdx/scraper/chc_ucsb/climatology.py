@@ -0,0 +1,112 @@
+import logging
+import warnings
+from pathlib import Path
+from timeit import default_timer as timer
+from typing import Callable, Dict, Iterator, List, Sequence
+
+import numpy
+import rasterio
+from rasterio.windows import Window
+
+logger = logging.getLogger(__name__)
+
+_STATISTICS: Dict[str, Callable[[numpy.ndarray], numpy.ndarray]] = {
+    "mean": lambda stack: numpy.nanmean(stack, axis=0),
+    "min": lambda stack: numpy.nanmin(stack, axis=0),
+    "max": lambda stack: numpy.nanmax(stack, axis=0),
+    "sum": lambda stack: numpy.nansum(stack, axis=0),
+    "std": lambda stack: numpy.nanstd(stack, axis=0),
+}
+
+
+class Climatology:
+    """Climatology class that reduces the yearly rasters of a product and month to
+    per pixel summary statistics"""
+
+    def __init__(self, statistics: Sequence[str], block_size: int = 512):
+        """Climatology constructor
+
+        Args:
+            statistics (Sequence[str]): Statistics to compute, one band each
+            block_size (int): Size of square blocks to read. Defaults to 512.
+        """
+        unknown = [
+            statistic for statistic in statistics if statistic not in _STATISTICS
+        ]
+        if unknown:
+            raise ValueError(f"Unknown climatology statistics {', '.join(unknown)}!")
+        self._statistics = list(statistics)
+        self._block_size = block_size
+
+    def windows(self, width: int, height: int) -> Iterator[Window]:
+        """Yields square windows covering a raster of the given size
+
+        Args:
+            width (int): Raster width
+            height (int): Raster height
+
+        Returns:
+            Iterator[Window]: Windows covering the raster
+        """
+        for row_off in range(0, height, self._block_size):
+            for col_off in range(0, width, self._block_size):
+                yield Window(
+                    col_off,
+                    row_off,
+                    min(self._block_size, width - col_off),
+                    min(self._block_size, height - row_off),
+                )
+
+    def process(self, tif_paths: List[Path], output_path: str) -> None:
+        """Reads the rasters window by window, stacks each window over the years
+        and writes one float32 band per statistic to a tiled GeoTIFF so that memory
+        use depends on the block size and number of years, not the raster size
+
+        Args:
+            tif_paths (List[Path]): Yearly rasters of one product and month
+            output_path (str): Path of output GeoTIFF
+
+        Returns:
+            None
+        """
+        start_time = timer()
+        sources = [rasterio.open(tif_path) for tif_path in tif_paths]
+        try:
+            profile = sources[0].profile
+            profile.update(
+                driver="GTiff",
+                dtype="float32",
+                count=len(self._statistics),
+                nodata=numpy.nan,
+                tiled=True,
+                blockxsize=self._block_size,
+                blockysize=self._block_size,
+                compress="deflate",
+            )
+            with rasterio.open(output_path, "w", **profile) as dst:
+                for band, statistic in enumerate(self._statistics, start=1):
+                    dst.set_band_description(band, statistic)
+                for window in self.windows(dst.width, dst.height):
+                    stack = numpy.stack(
+                        [
+                            src.read(1, window=window, masked=True)
+                            .astype("float32")
+                            .filled(numpy.nan)
+                            for src in sources
+                        ]
+                    )
+                    with warnings.catch_warnings():
+                        # All nodata pixels legitimately reduce to nan
+                        warnings.simplefilter("ignore", category=RuntimeWarning)
+                        for band, statistic in enumerate(self._statistics, start=1):
+                            dst.write(
+                                _STATISTICS[statistic](stack).astype("float32"),
+                                band,
+                                window=window,
+                            )
+        finally:
+            for src in sources:
+                src.close()
+        logger.info(
+            f"Climatology {output_path} execution time: {timer() - start_time} seconds"
+        )
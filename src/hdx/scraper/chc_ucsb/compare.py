@@ -0,0 +1,56 @@
+#!/usr/bin/python
+"""
+Script that compares the stage metrics of the latest run in the run metrics
+history against a rolling baseline of previous runs and flags stages that have
+slowed down. Exits with status 1 if there are regressions.
+
+"""
+
+import argparse
+import logging
+import sys
+from os.path import join
+from typing import List, Optional
+
+from hdx.utilities.easy_logging import setup_logging
+from hdx.utilities.loader import load_yaml
+from hdx.utilities.path import script_dir_plus_file
+
+from hdx.scraper.chc_ucsb.metrics import MetricsStore
+
+logger = logging.getLogger(__name__)
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    """Compare latest run against baseline and log any regressions
+
+    Args:
+        args (Optional[List[str]]): Command line arguments. Defaults to sys.argv.
+
+    Returns:
+        int: 1 if there are regressions, 0 otherwise
+    """
+    metrics = load_yaml(
+        script_dir_plus_file(join("config", "project_configuration.yaml"), main)
+    )["metrics"]
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--history-file", default=metrics["history_file"])
+    parser.add_argument("--baseline-runs", type=int, default=metrics["baseline_runs"])
+    parser.add_argument("--threshold", type=float, default=metrics["threshold"])
+    parsed = parser.parse_args(args)
+
+    regressions = MetricsStore(parsed.history_file).compare(
+        parsed.baseline_runs, parsed.threshold
+    )
+    for regression in regressions:
+        logger.warning(
+            f"{regression['variable']} {regression['scenario']} {regression['stage']} is {regression['slowdown']:.0%} slower than baseline ({regression['retries']} retries)"
+        )
+    if not regressions:
+        logger.info("No stage regressions against baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    setup_logging()
+    sys.exit(main())
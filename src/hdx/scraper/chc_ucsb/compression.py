@@ -0,0 +1,172 @@
+import logging
+import zlib
+from pathlib import Path
+from threading import Lock
+from time import thread_time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Compression methods supported by deterministic-zip. It does not take a deflate
+# level and uses Go's default, which matches zlib's default level.
+METHODS = ("store", "deflate")
+_DEFLATE_LEVEL = 6
+
+
+class CompressionPolicy:
+    """CompressionPolicy class that chooses the zip compression method of each
+    product. A product's policy is store, deflate or auto. For auto, a few members
+    of the first unit of the product are deflated to measure compression ratio and
+    CPU time and the method with the smallest estimated build plus upload time at
+    the measured upload speed is used for all units of the product. A method
+    chosen in a previous run is reused unless rebenchmark is set, so that zips and
+    their hashes stay the same from run to run and unchanged files are not
+    uploaded again."""
+
+    def __init__(
+        self,
+        default: str = "deflate",
+        products: Optional[Dict[str, str]] = None,
+        sample_members: int = 3,
+        sample_bytes: int = 16 * 1024 * 1024,
+        upload_bytes_per_second: float = 10 * 1024 * 1024,
+        previous: Optional[Dict[str, Dict[str, Dict]]] = None,
+        rebenchmark: bool = False,
+    ):
+        """CompressionPolicy constructor
+
+        Args:
+            default (str): Policy of products not in products. Defaults to deflate.
+            products (Optional[Dict[str, str]]): Policy by product. Defaults to None.
+            sample_members (int): Members to sample for auto. Defaults to 3.
+            sample_bytes (int): Maximum bytes read from each member. Defaults to 16MB.
+            upload_bytes_per_second (float): Upload speed until one is measured. Defaults to 10MB/s.
+            previous (Optional[Dict[str, Dict[str, Dict]]]): Decisions of previous run by variable and product. Defaults to None.
+            rebenchmark (bool): Decide auto products again ignoring previous. Defaults to False.
+        """
+        self._policies = dict(products or {})
+        self._default = default
+        for policy in [default, *self._policies.values()]:
+            if policy not in (*METHODS, "auto"):
+                raise ValueError(f"Unknown compression policy {policy}!")
+        self._sample_members = sample_members
+        self._sample_bytes = sample_bytes
+        self._upload_bytes_per_second = upload_bytes_per_second
+        self._uploaded_bytes = 0
+        self._upload_seconds = 0.0
+        self._previous = previous or {}
+        self._rebenchmark = rebenchmark
+        self._decisions: Dict[Tuple[str, str], Dict] = {}
+        self._lock = Lock()
+
+    def get_policy(self, product: str) -> str:
+        return self._policies.get(product, self._default)
+
+    def record_upload(self, nbytes: int, seconds: float) -> None:
+        """Record an upload that sent files so that auto uses the measured upload
+        speed
+
+        Args:
+            nbytes (int): Number of bytes uploaded
+            seconds (float): Seconds taken
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._uploaded_bytes += nbytes
+            self._upload_seconds += seconds
+
+    def get_upload_speed(self) -> float:
+        """Get measured upload speed or the configured speed if there have been no
+        uploads yet
+
+        Returns:
+            float: Bytes per second
+        """
+        with self._lock:
+            if self._uploaded_bytes and self._upload_seconds:
+                return self._uploaded_bytes / self._upload_seconds
+            return self._upload_bytes_per_second
+
+    def sample(self, tif_paths: List[Path]) -> Dict:
+        """Deflate members spread evenly through the sorted inputs measuring the
+        compression ratio and CPU seconds per byte
+
+        Args:
+            tif_paths (List[Path]): Members of the zip
+
+        Returns:
+            Dict: Ratio of compressed to original size and CPU seconds per byte
+        """
+        step = max(1, len(tif_paths) // self._sample_members)
+        original = 0
+        compressed = 0
+        cpu_seconds = 0.0
+        for tif_path in tif_paths[::step][: self._sample_members]:
+            with open(tif_path, "rb") as f:
+                data = f.read(self._sample_bytes)
+            start = thread_time()
+            compressor = zlib.compressobj(_DEFLATE_LEVEL, zlib.DEFLATED, -15)
+            size = len(compressor.compress(data)) + len(compressor.flush())
+            cpu_seconds += thread_time() - start
+            original += len(data)
+            compressed += min(size, len(data))
+        if not original:
+            return {"ratio": 1.0, "cpu_seconds_per_byte": 0.0}
+        return {
+            "ratio": compressed / original,
+            "cpu_seconds_per_byte": cpu_seconds / original,
+        }
+
+    def choose(self, variable: str, product: str, tif_directory: Path) -> Dict:
+        """Get the compression method for a product of a variable. For auto, the
+        method of the previous run is reused if there is one unless rebenchmark is
+        set, otherwise it is decided from the given inputs the first time.
+
+        Args:
+            variable (str): Variable
+            product (str): Product
+            tif_directory (Path): Directory of the tifs to zip
+
+        Returns:
+            Dict: Decision including the method
+        """
+        policy = self.get_policy(product)
+        if policy != "auto":
+            return {"policy": policy, "method": policy}
+        with self._lock:
+            decision = self._decisions.get((variable, product))
+        if decision:
+            return decision
+        previous = self._previous.get(variable, {}).get(product)
+        if not self._rebenchmark and previous and previous.get("method") in METHODS:
+            decision = {**previous, "policy": policy}
+            logger.info(
+                f"Compression of {variable} {product}: {decision['method']} as in previous run"
+            )
+            with self._lock:
+                return self._decisions.setdefault((variable, product), decision)
+        tif_paths = sorted(Path(tif_directory).glob("*.tif"))
+        total_bytes = sum(tif_path.stat().st_size for tif_path in tif_paths)
+        measurements = self.sample(tif_paths)
+        upload_speed = self.get_upload_speed()
+        store_seconds = total_bytes / upload_speed
+        deflate_seconds = (
+            total_bytes * measurements["cpu_seconds_per_byte"]
+            + total_bytes * measurements["ratio"] / upload_speed
+        )
+        decision = {
+            "policy": policy,
+            "method": "deflate" if deflate_seconds < store_seconds else "store",
+            **measurements,
+            "upload_bytes_per_second": upload_speed,
+            "estimated_store_seconds": store_seconds,
+            "estimated_deflate_seconds": deflate_seconds,
+        }
+        logger.info(
+            f"Compression of {variable} {product}: {decision['method']} (ratio {measurements['ratio']:.3f}, estimated {store_seconds:.1f}s stored vs {deflate_seconds:.1f}s deflated)"
+        )
+        with self._lock:
+            # Keep the first decision if another thread decided at the same time
+            return self._decisions.setdefault((variable, product), decision)
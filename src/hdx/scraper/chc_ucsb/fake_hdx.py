@@ -0,0 +1,441 @@
+#!/usr/bin/python
+"""
+Local stand-in for the HDX CKAN API implementing the package, resource and user
+actions that hdx-python-api calls when publishing, including file uploads, so that
+the publish path can be load tested offline. For example:
+
+    python -m hdx.scraper.chc_ucsb.fake_hdx --port 5000 --latency 0.05 \
+        --error-rate 0.01 --organization 6e30eb6d-52f9-49de-b2cd-2d68fced05c5
+    python -m hdx.scraper.chc_ucsb --hdx-url http://localhost:5000 --hdx-key fake
+
+"""
+
+import argparse
+import json
+import logging
+import random
+from collections import Counter
+from copy import deepcopy
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tempfile import NamedTemporaryFile
+from threading import Lock, Thread
+from time import sleep
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+from uuid import uuid4
+
+from hdx.utilities.dateparse import now_utc_notz
+from hdx.utilities.file_hashing import get_size_and_hash
+
+from hdx.scraper.chc_ucsb.bandwidth import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class CKANError(Exception):
+    """Error returned to the client in CKAN's format"""
+
+    def __init__(self, status: int, error_type: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.error_type = error_type
+
+
+class FakeHDX:
+    """FakeHDX class that serves an in-memory CKAN action API over HTTP. Each
+    request can be delayed by a fixed latency, request bodies are metered through a
+    token bucket shared by all connections to cap throughput and a fraction of
+    requests can be failed with 503 to exercise client retries."""
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 0,
+        latency: float = 0.0,
+        throughput: Optional[float] = None,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+        organizations: Tuple[str, ...] = (),
+    ):
+        """FakeHDX constructor
+
+        Args:
+            host (str): Host to listen on. Defaults to localhost.
+            port (int): Port to listen on. Defaults to 0 (any free port).
+            latency (float): Seconds added to every request. Defaults to 0.
+            throughput (Optional[float]): Cap on request bytes per second. Defaults to None (unlimited).
+            error_rate (float): Fraction of requests failed with 503. Defaults to 0.
+            seed (Optional[int]): Seed for choosing failed requests. Defaults to None.
+            organizations (Tuple[str, ...]): Organizations the user can write to. Defaults to ().
+        """
+        self._latency = latency
+        self._bucket = TokenBucket(throughput)
+        self._error_rate = error_rate
+        self._random = random.Random(seed)
+        self._organizations = organizations
+        self._lock = Lock()
+        self._packages: Dict[str, Dict] = {}
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.uploaded_bytes = 0
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeHDX":
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Fake HDX listening on {self.url}")
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeHDX":
+        return self.start()
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+    def get_package(self, name_or_id: str) -> Optional[Dict]:
+        """Get a copy of a package by name or id
+
+        Args:
+            name_or_id (str): Package name or id
+
+        Returns:
+            Optional[Dict]: Package or None if it doesn't exist
+        """
+        with self._lock:
+            package = self._find_package(name_or_id)
+            return deepcopy(package) if package else None
+
+    def get_statistics(self) -> Dict:
+        """Get counts of calls by action, injected errors and uploaded bytes
+
+        Returns:
+            Dict: Statistics
+        """
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "errors": dict(self.errors),
+                "uploaded_bytes": self.uploaded_bytes,
+            }
+
+    def _make_handler(self) -> type:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                path, _, query = self.path.partition("?")
+                self.respond(*fake.handle(path, dict(parse_qsl(query)), {}, 0))
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                data, files = parse_body(self.headers.get("Content-Type", ""), body)
+                self.respond(*fake.handle(self.path, data, files, length))
+
+            def respond(self, status: int, response: Dict) -> None:
+                body = json.dumps(response).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                logger.debug(format % args)
+
+        return Handler
+
+    def handle(
+        self, path: str, data: Dict, files: Dict[str, Tuple[str, bytes]], length: int
+    ) -> Tuple[int, Dict]:
+        """Handle a CKAN action request
+
+        Args:
+            path (str): Request path
+            data (Dict): Action parameters
+            files (Dict[str, Tuple[str, bytes]]): Uploaded files by field name
+            length (int): Number of bytes in request
+
+        Returns:
+            Tuple[int, Dict]: HTTP status and CKAN response
+        """
+        action = path.rstrip("/").split("/")[-1]
+        if self._latency:
+            sleep(self._latency)
+        self._bucket.consume(length)
+        with self._lock:
+            self.calls[action] += 1
+            if self._error_rate and self._random.random() < self._error_rate:
+                self.errors[action] += 1
+                return 503, {"success": False, "error": {"message": "Injected"}}
+            try:
+                function = getattr(self, f"_action_{action}", None)
+                if not path.startswith("/api/") or function is None:
+                    raise CKANError(400, "Bad Request", f"Unknown action {action}")
+                return 200, {"success": True, "result": function(data, files)}
+            except CKANError as ex:
+                return ex.status, {
+                    "success": False,
+                    "error": {"__type": ex.error_type, "message": str(ex)},
+                }
+
+    def _find_package(self, name_or_id: str) -> Optional[Dict]:
+        package = self._packages.get(name_or_id)
+        if package:
+            return package
+        for package in self._packages.values():
+            if package["name"] == name_or_id:
+                return package
+        return None
+
+    def _get_package(self, name_or_id: str) -> Dict:
+        package = self._find_package(name_or_id)
+        if package is None:
+            raise CKANError(404, "Not Found Error", "Dataset not found")
+        return package
+
+    def _get_resource(self, resource_id: str) -> Tuple[Dict, int]:
+        for package in self._packages.values():
+            for index, resource in enumerate(package["resources"]):
+                if resource["id"] == resource_id:
+                    return package, index
+        raise CKANError(404, "Not Found Error", "Resource was not found.")
+
+    def _make_resource(
+        self,
+        package: Dict,
+        resource: Dict,
+        files: Dict[str, Tuple[str, bytes]],
+        previous: Optional[Dict] = None,
+    ) -> Dict:
+        resource = {**(previous or {}), **resource}
+        resource.setdefault("id", str(uuid4()))
+        resource["package_id"] = package["id"]
+        resource.pop("upload", None)
+        upload = files.get("upload")
+        if upload:
+            filename, content = upload
+            with NamedTemporaryFile() as f:
+                f.write(content)
+                f.flush()
+                size, hash = get_size_and_hash(f.name, resource.get("format", ""))
+            resource["url"] = (
+                f"{self.url}/dataset/{package['id']}/resource/{resource['id']}/download/{filename}"
+            )
+            resource["url_type"] = "upload"
+            resource["size"] = size
+            resource["hash"] = hash
+            self.uploaded_bytes += size
+        resource["last_modified"] = now_utc_notz().isoformat()
+        return resource
+
+    def _set_resources(self, package: Dict, resources: List[Dict]) -> None:
+        existing = {resource["id"]: resource for resource in package["resources"]}
+        package["resources"] = [
+            self._make_resource(package, resource, {}, existing.get(resource.get("id")))
+            for resource in resources
+        ]
+        self._renumber(package)
+
+    @staticmethod
+    def _renumber(package: Dict) -> None:
+        for position, resource in enumerate(package["resources"]):
+            resource["position"] = position
+        package["num_resources"] = len(package["resources"])
+
+    def _action_user_show(self, data: Dict, files: Dict) -> Dict:
+        return {"id": "fake", "name": "fake"}
+
+    def _action_organization_list_for_user(self, data: Dict, files: Dict) -> List[Dict]:
+        return [{"id": org, "name": org} for org in self._organizations]
+
+    def _action_package_show(self, data: Dict, files: Dict) -> Dict:
+        return self._get_package(data.get("id", ""))
+
+    def _action_package_create(self, data: Dict, files: Dict) -> Dict:
+        if self._find_package(data.get("name", "")):
+            raise CKANError(409, "Validation Error", "That URL is already in use.")
+        package = {**data, "id": str(uuid4()), "resources": []}
+        self._packages[package["id"]] = package
+        self._set_resources(package, data.get("resources", []))
+        return package
+
+    def _action_package_update(self, data: Dict, files: Dict) -> Dict:
+        package = self._get_package(data.get("id") or data.get("name", ""))
+        resources = data.get("resources")
+        updated = {**data, "id": package["id"], "resources": package["resources"]}
+        self._packages[package["id"]] = updated
+        if resources is not None:
+            self._set_resources(updated, resources)
+        return updated
+
+    def _action_package_patch(self, data: Dict, files: Dict) -> Dict:
+        package = self._get_package(data.get("id", ""))
+        resources = data.pop("resources", None)
+        package.update({key: value for key, value in data.items() if key != "id"})
+        if resources is not None:
+            self._set_resources(package, resources)
+        return package
+
+    def _action_package_revise(self, data: Dict, files: Dict) -> Dict:
+        def load(key: str, default: Any) -> Any:
+            value = data.get(key, default)
+            return json.loads(value) if isinstance(value, str) else value
+
+        match = load("match", {})
+        package = self._get_package(match.get("id") or match.get("name", ""))
+        # Filters remove keys or list elements before the update is merged
+        for key in load("filter", []):
+            key, _, index = key.lstrip("-").partition("__")
+            if index:
+                del package[key][int(index)]
+            else:
+                package.pop(key, None)
+        update = load("update", {})
+        resources = update.pop("resources", None)
+        package.update(update)
+        if resources is not None:
+            existing = package["resources"]
+            for index, resource in enumerate(resources):
+                previous = existing[index] if index < len(existing) else None
+                upload = files.get(f"update__resources__{index}__upload")
+                resource = self._make_resource(
+                    package, resource, {"upload": upload} if upload else {}, previous
+                )
+                if previous:
+                    existing[index] = resource
+                else:
+                    existing.append(resource)
+            self._renumber(package)
+        return {"package": package}
+
+    def _action_package_resource_reorder(self, data: Dict, files: Dict) -> Dict:
+        package = self._get_package(data.get("id", ""))
+        order = data.get("order", [])
+        resources = {resource["id"]: resource for resource in package["resources"]}
+        if set(order) - set(resources):
+            raise CKANError(409, "Validation Error", "Invalid resource id in order")
+        package["resources"] = [resources[id] for id in order] + [
+            resource for id, resource in resources.items() if id not in order
+        ]
+        self._renumber(package)
+        return {"id": package["id"], "order": order}
+
+    def _action_package_create_default_resource_views(
+        self, data: Dict, files: Dict
+    ) -> List:
+        return []
+
+    def _action_hdx_dataset_purge(self, data: Dict, files: Dict) -> None:
+        package = self._get_package(data.get("id", ""))
+        del self._packages[package["id"]]
+
+    def _action_resource_show(self, data: Dict, files: Dict) -> Dict:
+        package, index = self._get_resource(data.get("id", ""))
+        return package["resources"][index]
+
+    def _action_resource_create(self, data: Dict, files: Dict) -> Dict:
+        package = self._get_package(data.get("package_id", ""))
+        data.pop("id", None)
+        resource = self._make_resource(package, data, files)
+        package["resources"].append(resource)
+        self._renumber(package)
+        return resource
+
+    def _action_resource_update(self, data: Dict, files: Dict) -> Dict:
+        package, index = self._get_resource(data.get("id", ""))
+        resource = self._make_resource(package, data, files)
+        package["resources"][index] = resource
+        self._renumber(package)
+        return resource
+
+    def _action_resource_patch(self, data: Dict, files: Dict) -> Dict:
+        package, index = self._get_resource(data.get("id", ""))
+        resource = self._make_resource(
+            package, data, files, package["resources"][index]
+        )
+        package["resources"][index] = resource
+        self._renumber(package)
+        return resource
+
+    def _action_resource_delete(self, data: Dict, files: Dict) -> None:
+        package, index = self._get_resource(data.get("id", ""))
+        del package["resources"][index]
+        self._renumber(package)
+
+
+def parse_body(
+    content_type: str, body: bytes
+) -> Tuple[Dict, Dict[str, Tuple[str, bytes]]]:
+    """Parse a JSON or multipart form request body into action parameters and
+    uploaded files
+
+    Args:
+        content_type (str): Content-Type header
+        body (bytes): Request body
+
+    Returns:
+        Tuple[Dict, Dict[str, Tuple[str, bytes]]]: Parameters and files by field name
+    """
+    if not body:
+        return {}, {}
+    if not content_type.startswith("multipart/form-data"):
+        return json.loads(body), {}
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body
+    )
+    data = {}
+    files = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        content = part.get_payload(decode=True)
+        filename = part.get_filename()
+        if filename:
+            files[name] = (filename, content)
+        else:
+            data[name] = content.decode("utf-8")
+    return data, files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake HDX CKAN API")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--throughput", type=float, default=None)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--organization", action="append", default=[])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    fake_hdx = FakeHDX(
+        args.host,
+        args.port,
+        args.latency,
+        args.throughput,
+        args.error_rate,
+        args.seed,
+        tuple(args.organization),
+    )
+    fake_hdx.start()
+    try:
+        fake_hdx._thread.join()
+    except KeyboardInterrupt:
+        fake_hdx.stop()
@@ -0,0 +1,106 @@
+#!/usr/bin/python
+"""
+Script run either before a sharded run to create or update the metadata of the
+datasets or after it to combine the shard reports and commit the final resource
+ordering of each dataset in HDX.
+
+"""
+
+import logging
+from os.path import expanduser, join
+
+from hdx.api.configuration import Configuration
+from hdx.data.dataset import Dataset
+from hdx.data.user import User
+from hdx.facades.infer_arguments import facade
+from hdx.utilities.downloader import Download
+from hdx.utilities.path import (
+    script_dir_plus_file,
+    wheretostart_tempdir_batch,
+)
+from hdx.utilities.retriever import Retrieve
+
+from hdx.scraper.chc_ucsb.__main__ import _LOOKUP, _SAVED_DATA_DIR, _UPDATED_BY_SCRIPT
+from hdx.scraper.chc_ucsb._version import __version__
+from hdx.scraper.chc_ucsb.pipeline import Pipeline
+from hdx.scraper.chc_ucsb.publish import (
+    diff_dataset_metadata,
+    finalise_resources,
+    log_metadata_diff,
+)
+from hdx.scraper.chc_ucsb.shards import merge_shard_reports
+from hdx.scraper.chc_ucsb.tiff_download import TIFFDownload
+
+logger = logging.getLogger(__name__)
+
+
+def main(prepare: bool = False) -> None:
+    """Prepare datasets in HDX for a sharded run or merge its shard reports
+
+    Args:
+        prepare (bool): Create or update dataset metadata only. Defaults to False.
+
+    Returns:
+        None
+    """
+    logger.info(f"##### {_LOOKUP} merge version {__version__} ####")
+    configuration = Configuration.read()
+    User.check_current_user_write_access("6e30eb6d-52f9-49de-b2cd-2d68fced05c5")
+
+    with wheretostart_tempdir_batch(folder=_LOOKUP) as info:
+        tempdir = info["folder"]
+        with Download() as downloader:
+            retriever = Retrieve(
+                downloader=downloader,
+                fallback_dir=tempdir,
+                saved_dir=_SAVED_DATA_DIR,
+                temp_dir=tempdir,
+                save=False,
+                use_saved=False,
+            )
+            pipeline = Pipeline(TIFFDownload(), configuration, retriever, tempdir)
+            work_graph = pipeline.get_work_graph()
+            if not prepare:
+                resource_ids = merge_shard_reports(
+                    configuration["run_report_dir"], work_graph
+                )
+
+            for variable, scenario in work_graph.get_datasets():
+                dataset = pipeline.generate_dataset(variable, scenario)
+                dataset.update_from_yaml(
+                    script_dir_plus_file(
+                        join("config", "hdx_dataset_static.yaml"), main
+                    )
+                )
+                if not prepare:
+                    finalise_resources(
+                        dataset["name"],
+                        resource_ids[(variable, scenario)],
+                        True,
+                        None,
+                        _UPDATED_BY_SCRIPT,
+                        info["batch"],
+                    )
+                    continue
+                live_dataset = Dataset.read_from_hdx(dataset["name"])
+                changes = diff_dataset_metadata(dataset, live_dataset)
+                log_metadata_diff(dataset["name"], changes)
+                if live_dataset is not None and not changes:
+                    continue
+                dataset.create_in_hdx(
+                    allow_no_resources=True,
+                    hxl_update=False,
+                    updated_by_script=_UPDATED_BY_SCRIPT,
+                    batch=info["batch"],
+                )
+
+
+if __name__ == "__main__":
+    facade(
+        main,
+        user_agent_config_yaml=join(expanduser("~"), ".useragents.yaml"),
+        user_agent_lookup=_LOOKUP,
+        project_config_yaml=script_dir_plus_file(
+            join("config", "project_configuration.yaml"), main
+        ),
+    )
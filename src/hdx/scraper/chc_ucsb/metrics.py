@@ -0,0 +1,241 @@
+import json
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from statistics import median
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("rsync", "zip", "upload")
+
+
+class RunMetrics:
+    """RunMetrics class that totals the durations, bytes and retries of the rsync,
+    zip and upload stages of each variable and scenario in a run"""
+
+    def __init__(self):
+        self._stages: Dict[Tuple[str, str, str], Dict] = {}
+        self._lock = Lock()
+
+    def record(
+        self,
+        variable: str,
+        scenario: str,
+        stage: str,
+        seconds: float,
+        nbytes: int,
+        retries: int = 0,
+    ) -> None:
+        """Add a timed operation to the totals of a stage
+
+        Args:
+            variable (str): Variable
+            scenario (str): Scenario
+            stage (str): rsync, zip or upload
+            seconds (float): Duration in seconds
+            nbytes (int): Bytes transferred or written
+            retries (int): Number of retries. Defaults to 0.
+
+        Returns:
+            None
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage {stage}!")
+        with self._lock:
+            totals = self._stages.setdefault(
+                (variable, scenario, stage),
+                {"count": 0, "seconds": 0.0, "bytes": 0, "retries": 0},
+            )
+            totals["count"] += 1
+            totals["seconds"] += seconds
+            totals["bytes"] += nbytes
+            totals["retries"] += retries
+
+    def add_retries(
+        self, variable: str, scenario: str, stage: str, retries: int
+    ) -> None:
+        with self._lock:
+            totals = self._stages.get((variable, scenario, stage))
+            if totals:
+                totals["retries"] += retries
+
+    def get_stages(self) -> List[Dict]:
+        """Get totals of each stage with throughput in bytes per second
+
+        Returns:
+            List[Dict]: Stage totals
+        """
+        stages = []
+        with self._lock:
+            for (variable, scenario, stage), totals in sorted(self._stages.items()):
+                seconds = totals["seconds"]
+                stages.append(
+                    {
+                        "variable": variable,
+                        "scenario": scenario,
+                        "stage": stage,
+                        **totals,
+                        "bytes_per_second": totals["bytes"] / seconds
+                        if seconds
+                        else None,
+                    }
+                )
+        return stages
+
+
+class RetryCounter:
+    """RetryCounter class with a requests response hook that counts the retries
+    urllib3 made before each response"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = Lock()
+
+    def hook(self, response: Any, *args: Any, **kwargs: Any) -> None:
+        retries = getattr(response.raw, "retries", None)
+        if retries is None:
+            return
+        with self._lock:
+            self.count += len(retries.history)
+
+
+class MetricsStore:
+    """MetricsStore class that appends the stage metrics of each run (or shard of
+    a run) to a JSON lines file and compares the latest run against a rolling
+    baseline of the runs before it. The records of the shards of a run share a
+    run id and are combined into one run for comparison."""
+
+    def __init__(self, path: str):
+        """MetricsStore constructor
+
+        Args:
+            path (str): Path of JSON lines file
+        """
+        self._path = Path(path)
+
+    def append(self, metrics: RunMetrics, **run_info: Any) -> Dict:
+        """Append a run's metrics to the history
+
+        Args:
+            metrics (RunMetrics): Metrics of run
+            **run_info: Other information about the run eg. run_id and shard
+
+        Returns:
+            Dict: Record appended
+        """
+        record = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            **run_info,
+            "stages": metrics.get_stages(),
+        }
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._path, "a") as f:
+            f.write(json.dumps(record))
+            f.write("\n")
+        logger.info(f"Appended run metrics to {self._path}")
+        return record
+
+    def load(self) -> List[Dict]:
+        """Load the history of runs oldest first
+
+        Returns:
+            List[Dict]: Run records
+        """
+        if not self._path.exists():
+            return []
+        runs = []
+        with open(self._path) as f:
+            for line in f:
+                if line.strip():
+                    runs.append(json.loads(line))
+        return runs
+
+    def load_runs(self) -> List[Dict]:
+        """Load the history oldest first combining records with the same run_id
+        (the shards of a run) by totalling their stages. Records without a run_id
+        are each a run of their own.
+
+        Returns:
+            List[Dict]: Runs
+        """
+        runs = {}
+        for index, record in enumerate(self.load()):
+            run_id = record.get("run_id") or f"record {index}"
+            run = runs.setdefault(
+                run_id,
+                {"run_id": run_id, "timestamp": record["timestamp"], "stages": {}},
+            )
+            for stage in record["stages"]:
+                key = (stage["variable"], stage["scenario"], stage["stage"])
+                totals = run["stages"].setdefault(
+                    key,
+                    {
+                        "variable": key[0],
+                        "scenario": key[1],
+                        "stage": key[2],
+                        "count": 0,
+                        "seconds": 0.0,
+                        "bytes": 0,
+                        "retries": 0,
+                    },
+                )
+                for field in ("count", "seconds", "bytes", "retries"):
+                    totals[field] += stage[field]
+        return [
+            {**run, "stages": list(run["stages"].values())} for run in runs.values()
+        ]
+
+    def compare(self, baseline_runs: int = 5, threshold: float = 0.25) -> List[Dict]:
+        """Find stages of the latest run that were slower than the median of the
+        same stage in up to baseline_runs previous runs by more than threshold.
+        Speed is throughput where bytes were recorded and otherwise seconds per
+        operation.
+
+        Args:
+            baseline_runs (int): Number of previous runs in baseline. Defaults to 5.
+            threshold (float): Fractional slowdown to flag. Defaults to 0.25.
+
+        Returns:
+            List[Dict]: Regressions
+        """
+        runs = self.load_runs()
+        if len(runs) < 2:
+            return []
+        baseline = {}
+        for run in runs[-baseline_runs - 1 : -1]:
+            for stage in run["stages"]:
+                key = (stage["variable"], stage["scenario"], stage["stage"])
+                baseline.setdefault(key, []).append(get_seconds_per_unit(stage))
+        regressions = []
+        for stage in runs[-1]["stages"]:
+            key = (stage["variable"], stage["scenario"], stage["stage"])
+            values = [value for value in baseline.get(key, []) if value]
+            value = get_seconds_per_unit(stage)
+            if not values or value is None:
+                continue
+            baseline_value = median(values)
+            slowdown = value / baseline_value - 1
+            if slowdown > threshold:
+                regressions.append(
+                    {
+                        "variable": key[0],
+                        "scenario": key[1],
+                        "stage": key[2],
+                        "slowdown": slowdown,
+                        "seconds_per_unit": value,
+                        "baseline_seconds_per_unit": baseline_value,
+                        "retries": stage["retries"],
+                    }
+                )
+        return regressions
+
+
+def get_seconds_per_unit(stage: Dict) -> Optional[float]:
+    # Seconds per byte, or per operation for stages that moved no bytes
+    if stage["bytes"]:
+        return stage["seconds"] / stage["bytes"]
+    if stage["count"]:
+        return stage["seconds"] / stage["count"]
+    return None
@@ -5,21 +5,41 @@ import calendar
 import logging
 import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from os import remove
 from pathlib import Path
 from shutil import rmtree
-from typing import Callable, List, Optional, Tuple
+from threading import Lock
+from timeit import default_timer as timer
+from typing import Callable, ContextManager, Dict, List, Optional, Tuple
 
+import rasterio
 from deterministic_zip_go import exec
 from hdx.api.configuration import Configuration
 from hdx.data.dataset import Dataset
 from hdx.data.resource import Resource
+from hdx.utilities.file_hashing import get_size_and_hash
 from hdx.utilities.retriever import Retrieve
+from rasterio.shutil import copy as rasterio_copy
 
+from hdx.scraper.chc_ucsb.artifact_cache import ArtifactCache
+from hdx.scraper.chc_ucsb.bandwidth import BandwidthGovernor
+from hdx.scraper.chc_ucsb.climatology import Climatology
+from hdx.scraper.chc_ucsb.compression import CompressionPolicy
+from hdx.scraper.chc_ucsb.metrics import RunMetrics
+from hdx.scraper.chc_ucsb.profiling import ResourceSampler
+from hdx.scraper.chc_ucsb.report import RunReport
+from hdx.scraper.chc_ucsb.scheduler import Scheduler
+from hdx.scraper.chc_ucsb.staging import link_files
 from hdx.scraper.chc_ucsb.tiff_download import TIFFDownload
+from hdx.scraper.chc_ucsb.work_graph import WorkGraph
 
 logger = logging.getLogger(__name__)
 
+# Status hdx-python-api returns for a resource whose file was sent to HDX
+_FILE_UPLOADED = 2
+
 
 class Pipeline:
     def __init__(
@@ -28,23 +48,68 @@ class Pipeline:
         configuration: Configuration,
         retriever: Retrieve,
         tempdir: str,
+        report: Optional[RunReport] = None,
+        previous_report: Optional[RunReport] = None,
+        governor: Optional[BandwidthGovernor] = None,
+        metrics: Optional[RunMetrics] = None,
+        sampler: Optional[ResourceSampler] = None,
     ):
         self._tiff_download = tiff_download
         self._configuration = configuration
         self._retriever = retriever
         self._downloader = retriever.downloader
         self._tempdir = tempdir
-        self._base_url = self._configuration["base_url"]
-        self._zip_file = self._configuration["zip_file"]
+        self._report = report
+        self._governor = governor
+        self._metrics = metrics
+        self._sampler = sampler
+        self._work_graph = WorkGraph(configuration)
+        scheduling = self._configuration.get("scheduling", {})
+        self._max_workers = scheduling.get("max_workers", 1)
+        self._scheduler = Scheduler(
+            tiff_download,
+            self._work_graph,
+            scheduling.get("cost_source", "none"),
+            previous_report,
+        )
+        artifact_cache = self._configuration.get("artifact_cache", {})
+        if artifact_cache.get("directory"):
+            self._artifact_cache = ArtifactCache(
+                artifact_cache["directory"],
+                artifact_cache["max_size_mb"] * 1024 * 1024,
+            )
+        else:
+            self._artifact_cache = None
+        staging = self._configuration.get("staging", {})
+        self._mirror_directory = staging.get("mirror_directory")
+        compression = self._configuration.get("compression", {})
+        self._compression = CompressionPolicy(
+            compression.get("default", "deflate"),
+            compression.get("products"),
+            compression.get("sample_members", 3),
+            compression.get("sample_mb", 16) * 1024 * 1024,
+            compression.get("upload_mb_per_second", 10) * 1024 * 1024,
+            previous_report.data.get("compression") if previous_report else None,
+            compression.get("rebenchmark", False),
+        )
+        self._cog = self._configuration.get("cog", {})
+        self._climatology = self._configuration.get("climatology", {})
+        if self._climatology.get("enabled"):
+            self._climatology_builder = Climatology(
+                self._climatology["statistics"],
+                self._climatology.get("block_size", 512),
+            )
+        else:
+            self._climatology_builder = None
 
-    def make_deterministic_zip(self, zip_path, tif_directory):
+    def make_deterministic_zip(self, zip_path, tif_directory, method="deflate"):
         # Ensure absolute path for the output zip
         abs_zip_path = os.path.abspath(zip_path)
 
         # Run deterministic-zip sing cwd=tif_directory and zip "." to match shutil's
         # behavior of zipping the contents at the root of the archive
         process = exec.create_subprocess(
-            ["-r", abs_zip_path, "."],
+            ["-Z", method, "-r", abs_zip_path, "."],
             cwd=tif_directory,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
@@ -53,39 +118,193 @@ class Pipeline:
         stdout, stderr = process.communicate()
 
         if process.returncode != 0:
-            print(f"Error creating zip: {stderr.decode()}")
+            logger.error(f"Error creating zip {zip_path}: {stderr}")
+            # Never leave a partial zip to be uploaded or cached
+            if os.path.exists(abs_zip_path):
+                remove(abs_zip_path)
+            raise RuntimeError(
+                f"deterministic-zip failed with exit code {process.returncode} creating {zip_path}!"
+            )
+
+    def make_zip(self, zip_path, tif_directory, method="deflate"):
+        # Reuse a zip built from the same input files with the same compression
+        # method on a previous run if the artifact cache is enabled
+        if not self._artifact_cache:
+            self.make_deterministic_zip(zip_path, tif_directory, method)
+            return
+        key = self._artifact_cache.key(tif_directory, method)
+        if self._artifact_cache.get(key, zip_path):
+            return
+        if os.path.exists(zip_path):
+            remove(zip_path)
+        # Raises if the zip could not be built so only complete zips are cached
+        self.make_deterministic_zip(zip_path, tif_directory, method)
+        self._artifact_cache.put(key, zip_path)
+
+    def make_cog(self, cog_path, tif_directory):
+        # Stack the yearly rasters (sorted by filename so bands run by year) into
+        # a tiled intermediate GeoTIFF one band and block at a time, then let the
+        # GDAL COG driver add overviews and write the cloud optimized layout
+        tif_paths = sorted(Path(tif_directory).glob("*.tif"))
+        if not tif_paths:
+            raise ValueError(f"No tifs in {tif_directory} to build {cog_path}!")
+        blocksize = self._cog.get("blocksize", 512)
+        compress = self._cog.get("compress", "deflate")
+        with rasterio.open(tif_paths[0]) as src:
+            profile = src.profile
+        profile.update(
+            driver="GTiff",
+            count=len(tif_paths),
+            tiled=True,
+            blockxsize=blocksize,
+            blockysize=blocksize,
+            compress=compress,
+            BIGTIFF="IF_SAFER",
+        )
+        stack_path = f"{cog_path}.stack.tif"
+        with rasterio.open(stack_path, "w", **profile) as dst:
+            for band, tif_path in enumerate(tif_paths, start=1):
+                with rasterio.open(tif_path) as src:
+                    for _, window in dst.block_windows(band):
+                        dst.write(src.read(1, window=window), band, window=window)
+                dst.set_band_description(band, tif_path.stem)
+        rasterio_copy(
+            stack_path,
+            cog_path,
+            driver="COG",
+            blocksize=blocksize,
+            compress=compress,
+            overviews="AUTO",
+            bigtiff="IF_SAFER",
+        )
+        remove(stack_path)
+
+    @staticmethod
+    def get_template_fields(scenario: str, product: str = "", month: int = 0) -> Dict:
+        # Fields available to the naming templates of each variable
+        year = scenario[:4]
+        return {
+            "scenario": scenario,
+            "scenario_lower": scenario.lower(),
+            "scenario_print": f"{scenario[5:]} {year}",
+            "year": year,
+            "product": product,
+            "month": f"{month:02d}",
+            "month_name": calendar.month_name[month],
+        }
 
     def generate_resource(
-        self, scenario_path: Path, scenario: str, product: str, month: int
-    ) -> Tuple[Resource, str]:
-        month_str = f"{month:02d}"
-        filename = self._zip_file.format(product=product, month=month_str)
+        self,
+        scenario_path: Path,
+        variable: str,
+        scenario: str,
+        product: str,
+        month: int,
+    ) -> List[Tuple[Resource, str]]:
+        variable_configuration = self._work_graph.get_variable_configuration(variable)
+        fields = self.get_template_fields(scenario, product, month)
+        month_str = fields["month"]
+        filename = variable_configuration["zip_file"].format(**fields)
         logger.info(f"Generating resource with {filename}")
         tif_directory = scenario_path.joinpath(product, month_str)
-        source = f"{self._base_url}/{scenario}/{month_str}"
+        source = f"{variable_configuration['base_url']}/{scenario}/{month_str}"
         tif_directory.mkdir(parents=True, exist_ok=True)
-        _ = self._tiff_download.process(source, tif_directory, include=f"*{product}*")
+        include = f"*{product}*"
+        if self._mirror_directory:
+            # rsync only transfers files changed since the last run into the
+            # persistent mirror, deleting those removed from the server, and the
+            # unit's files are linked from there
+            download_directory = Path(
+                self._mirror_directory, variable, scenario, month_str
+            )
+            download_directory.mkdir(parents=True, exist_ok=True)
+        else:
+            download_directory = tif_directory
+        start_time = timer()
+        paths = self._tiff_download.process(
+            source,
+            download_directory,
+            include=include,
+            delete=bool(self._mirror_directory),
+        )
+        seconds = timer() - start_time
+        downloaded_bytes = self.get_downloaded_bytes(download_directory, paths)
+        if self._mirror_directory:
+            link_files(download_directory, tif_directory, include)
+        if self._metrics:
+            self._metrics.record(variable, scenario, "rsync", seconds, downloaded_bytes)
+        if self._governor:
+            # Charged after timing so that throttling is not reported as a slow
+            # server
+            self._governor.throttle_download(downloaded_bytes, seconds)
         zip_path = str(scenario_path.joinpath(filename))
-        self.make_deterministic_zip(zip_path, tif_directory)
-        month_name = calendar.month_name[month]
+        compression = self._compression.choose(variable, product, tif_directory)
+        if self._report:
+            self._report.set_compression(variable, product, compression)
+        start_time = timer()
+        self.make_zip(zip_path, tif_directory, compression["method"])
+        if self._metrics:
+            self._metrics.record(
+                variable,
+                scenario,
+                "zip",
+                timer() - start_time,
+                os.path.getsize(zip_path),
+            )
+        description = variable_configuration["resource_description"].format(**fields)
         resource = Resource(
             {
                 "name": filename,
-                "description": f"CHC-CMIP6 TMax Extremes per Country for {product} in {month_name}",
+                "description": description,
             }
         )
         resource.set_format("zipped geotiff")
         resource.set_file_to_upload(zip_path)
+        resources = [(resource, zip_path)]
+        if self._cog.get("enabled"):
+            filename = variable_configuration["cog_file"].format(**fields)
+            logger.info(f"Generating resource with {filename}")
+            cog_path = str(scenario_path.joinpath(filename))
+            self.make_cog(cog_path, tif_directory)
+            resource = Resource(
+                {
+                    "name": filename,
+                    "description": f"{description} as a multi-band Cloud Optimized GeoTIFF with one band per year",
+                }
+            )
+            resource.set_format("geotiff")
+            resource.set_file_to_upload(cog_path)
+            resources.append((resource, cog_path))
+        if self._climatology_builder:
+            filename = variable_configuration["climatology_file"].format(**fields)
+            logger.info(f"Generating resource with {filename}")
+            climatology_path = str(scenario_path.joinpath(filename))
+            self._climatology_builder.process(
+                sorted(tif_directory.glob("*.tif")), climatology_path
+            )
+            statistics = ", ".join(self._climatology["statistics"])
+            years = (
+                f"{self._configuration['start_year']}-{self._configuration['end_year']}"
+            )
+            resource = Resource(
+                {
+                    "name": filename,
+                    "description": f"{description} summarised over {years} per pixel ({statistics})",
+                }
+            )
+            resource.set_format("geotiff")
+            resource.set_file_to_upload(climatology_path)
+            resources.append((resource, climatology_path))
         rmtree(tif_directory)
-        return resource, zip_path
+        return resources
 
-    def generate_dataset(self, scenario: str) -> Optional[Dataset]:
-        year = scenario[:4]
-        dataset_name = f"chc_ucsb_tmax_{scenario.lower()}"
-        scenario_print = f"{scenario[5:]} {year}"
-        dataset_title = f"Projected Daily Maximum Temperature Extremes by Country: {scenario_print} Scenario (CHC-CMIP6)"
-        dataset_description = self._configuration["dataset_description"].format(
-            scenario=scenario_print
+    def generate_dataset(self, variable: str, scenario: str) -> Optional[Dataset]:
+        variable_configuration = self._work_graph.get_variable_configuration(variable)
+        fields = self.get_template_fields(scenario)
+        dataset_name = variable_configuration["dataset_name"].format(**fields)
+        dataset_title = variable_configuration["dataset_title"].format(**fields)
+        dataset_description = variable_configuration["dataset_description"].format(
+            **fields
         )
 
         # Dataset info
@@ -97,51 +316,170 @@ class Pipeline:
             }
         )
 
-        dataset.set_time_period_year_range(year)
+        dataset.set_time_period_year_range(fields["year"])
         dataset.add_tags(("climate-weather", "environment"))
         # Only if needed
         dataset.set_subnational(False)
         dataset.add_other_location("world")
         return dataset
 
+    @staticmethod
+    def get_downloaded_bytes(download_directory: Path, paths: List[str]) -> int:
+        # Size of the files rsync transferred
+        nbytes = 0
+        for path in paths:
+            path = download_directory.joinpath(path)
+            if path.is_file():
+                nbytes += path.stat().st_size
+        return nbytes
+
+    def throttle_upload(self, paths: List[str]) -> None:
+        # Charge uploads that sent files to the egress budget after they finish
+        # as HDX skips files whose hash is unchanged, delaying the next upload by
+        # any overshoot
+        if self._governor and paths:
+            self._governor.throttle_upload(sum(os.path.getsize(x) for x in paths))
+
+    def record_upload(
+        self, variable: str, scenario: str, paths: List[str], seconds: float
+    ) -> None:
+        # Measure upload speed for choosing compression methods and run metrics
+        # from uploads that sent files as HDX skips files whose hash is unchanged
+        if not paths:
+            return
+        nbytes = sum(os.path.getsize(x) for x in paths)
+        self._compression.record_upload(nbytes, seconds)
+        if self._metrics:
+            self._metrics.record(variable, scenario, "upload", seconds, nbytes)
+
+    @staticmethod
+    def get_checksums(
+        resources: List[Tuple[Resource, str]],
+    ) -> Dict[str, Tuple[int, str]]:
+        # Size and hash of each file computed as HDX does for verifying uploads
+        return {
+            resource["name"]: get_size_and_hash(path, resource.get_format())
+            for resource, path in resources
+        }
+
+    def profile_unit(
+        self, variable: str, scenario: str, product: str, month: int
+    ) -> ContextManager:
+        # Tag resource samples taken while processing a unit
+        if self._sampler:
+            return self._sampler.unit(variable, scenario, product, month)
+        return nullcontext()
+
+    def get_work_graph(self) -> WorkGraph:
+        return self._work_graph
+
     def add_resources(
         self,
         dataset: Dataset,
+        variable: str,
         scenario: str,
-        create_dataset_in_hdx: Callable[[Dataset], Dataset],
-        create_resource_in_hdx: Callable[[Resource, Dataset], Resource],
+        create_dataset_in_hdx: Callable[[Dataset], Tuple[Dataset, Dict[str, int]]],
+        create_resource_in_hdx: Callable[[Resource, Dataset], Tuple[Resource, int]],
+        units: Optional[List[Tuple[str, int]]] = None,
     ) -> List[str]:
-        scenario_path = Path(self._tempdir, scenario)
-        scenario_path.mkdir(exist_ok=True)
-        product = self._configuration["products"][0]
-        resource, zip_path = self.generate_resource(scenario_path, scenario, product, 1)
-        resource = dataset.add_update_resource(resource)
-        resource_id = resource.get("id")
-        dataset = create_dataset_in_hdx(dataset)
-        if not resource_id:
-            for res in dataset.get_resources():
-                if resource["name"] == res["name"]:
-                    resource_id = res["id"]
-                    break
-        if not resource_id:
-            raise ValueError("No resource id for first resource!")
-        resource_ids = [resource_id]
-
-        remove(zip_path)
-
-        def add_resource(product: str, month: int) -> None:
-            resource, zip_path = self.generate_resource(
-                scenario_path, scenario, product, month
+        all_units = self._work_graph.get_units(variable)
+        if units is None:
+            units = all_units
+        scenario_path = Path(self._tempdir, variable, scenario)
+        scenario_path.mkdir(parents=True, exist_ok=True)
+        product, month = units[0]
+        with self.profile_unit(variable, scenario, product, month):
+            resources = self.generate_resource(
+                scenario_path, variable, scenario, product, month
             )
-            resource = create_resource_in_hdx(resource, dataset)
+            resources = [
+                (dataset.add_update_resource(resource), path)
+                for resource, path in resources
+            ]
+            checksums = self.get_checksums(resources)
+            start_time = timer()
+            dataset, statuses = create_dataset_in_hdx(dataset)
+            seconds = timer() - start_time
+            uploaded_paths = [
+                path
+                for resource, path in resources
+                if statuses.get(resource["name"]) == _FILE_UPLOADED
+            ]
+            self.record_upload(variable, scenario, uploaded_paths, seconds)
+            self.throttle_upload(uploaded_paths)
+        resource_ids = []
+        created_resources = []
+        for resource, path in resources:
+            if not resource.get("id"):
+                for res in dataset.get_resources():
+                    if resource["name"] == res["name"]:
+                        resource = res
+                        break
+            if not resource.get("id"):
+                raise ValueError("No resource id for first resource!")
             resource_ids.append(resource["id"])
-            remove(zip_path)
+            created_resources.append(resource)
+            remove(path)
+        if self._report:
+            self._report.add_unit(
+                variable,
+                scenario,
+                all_units.index((product, month)),
+                product,
+                month,
+                created_resources,
+                checksums,
+            )
 
-        for month in range(2, 13):
-            add_resource(product, month)
+        # CKAN creates a resource by reading and rewriting its dataset, so
+        # concurrent creates in one dataset can lose resources. Downloads and zips
+        # run concurrently but writes to the dataset are made one at a time.
+        write_lock = Lock()
 
-        for product in self._configuration["products"][1:]:
-            for month in range(1, 13):
-                add_resource(product, month)
+        def add_resource(product: str, month: int) -> List[str]:
+            created_resources = []
+            checksums = {}
+            with self.profile_unit(variable, scenario, product, month):
+                for resource, path in self.generate_resource(
+                    scenario_path, variable, scenario, product, month
+                ):
+                    checksums.update(self.get_checksums([(resource, path)]))
+                    with write_lock:
+                        start_time = timer()
+                        resource, status = create_resource_in_hdx(resource, dataset)
+                        seconds = timer() - start_time
+                    uploaded_paths = [path] if status == _FILE_UPLOADED else []
+                    self.record_upload(variable, scenario, uploaded_paths, seconds)
+                    self.throttle_upload(uploaded_paths)
+                    created_resources.append(resource)
+                    remove(path)
+            if self._report:
+                self._report.add_unit(
+                    variable,
+                    scenario,
+                    all_units.index((product, month)),
+                    product,
+                    month,
+                    created_resources,
+                    checksums,
+                )
+            if self._governor:
+                self._governor.log_utilisation()
+            return [resource["id"] for resource in created_resources]
+
+        # Process the remaining units largest first but return resource ids in
+        # the canonical order of units. Order does not matter to a single worker
+        # so costs are not fetched.
+        if self._max_workers > 1:
+            ordered_units = self._scheduler.order(variable, scenario, units[1:])
+            logger.info(f"Processing order: {ordered_units}")
+        else:
+            ordered_units = units[1:]
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = {
+                unit: executor.submit(add_resource, *unit) for unit in ordered_units
+            }
+        for unit in units[1:]:
+            resource_ids.extend(futures[unit].result())
 
         return resource_ids
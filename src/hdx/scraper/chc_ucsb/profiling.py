@@ -0,0 +1,234 @@
+import csv
+import logging
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Event, Lock, Thread
+from time import monotonic, time
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("rss_bytes", "subprocesses", "open_fds", "scratch_bytes")
+
+
+def get_rss() -> Optional[int]:
+    # Resident set size of this process from /proc (Linux only)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def get_subprocess_count() -> Optional[int]:
+    # Number of direct children of this process eg. rsync and deterministic-zip
+    pid = os.getpid()
+    try:
+        names = os.listdir("/proc")
+    except OSError:
+        return None
+    count = 0
+    for name in names:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name in brackets may contain spaces so split after it
+        fields = stat[stat.rfind(")") + 2 :].split()
+        if int(fields[1]) == pid:
+            count += 1
+    return count
+
+
+def get_open_fd_count() -> Optional[int]:
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def get_directory_size(directory: str) -> int:
+    # Total size of files under directory ignoring files removed while walking
+    total = 0
+    for root, _, files in os.walk(directory):
+        for file in files:
+            try:
+                total += os.lstat(os.path.join(root, file)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class ResourceSampler:
+    """ResourceSampler class that samples process RSS, subprocess count, open file
+    descriptors and scratch directory usage in a background thread at a fixed
+    interval. Each sample is tagged with the units being processed at the time and
+    the samples can be exported as a CSV timeline and a Prometheus textfile with
+    the last and peak values."""
+
+    def __init__(self, scratch_directory: str, interval: float = 5.0):
+        """ResourceSampler constructor
+
+        Args:
+            scratch_directory (str): Scratch directory whose usage to sample
+            interval (float): Seconds between samples. Defaults to 5.
+        """
+        self._scratch_directory = scratch_directory
+        self._interval = interval
+        self._units: Dict[str, int] = {}
+        self._samples: List[Dict] = []
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+        self._start_time = monotonic()
+
+    @contextmanager
+    def unit(
+        self, variable: str, scenario: str, product: str, month: int
+    ) -> Iterator[None]:
+        """Tag samples taken inside the context with the unit
+
+        Args:
+            variable (str): Variable
+            scenario (str): Scenario
+            product (str): Product
+            month (int): Month
+
+        Returns:
+            Iterator[None]: Context
+        """
+        unit = f"{variable}/{scenario}/{product}/{month:02d}"
+        with self._lock:
+            self._units[unit] = self._units.get(unit, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._units[unit] -= 1
+                if not self._units[unit]:
+                    del self._units[unit]
+
+    def sample(self) -> Dict:
+        """Take a sample
+
+        Returns:
+            Dict: Sample
+        """
+        with self._lock:
+            units = ";".join(sorted(self._units))
+        sample = {
+            "timestamp": time(),
+            "elapsed_seconds": monotonic() - self._start_time,
+            "rss_bytes": get_rss(),
+            "subprocesses": get_subprocess_count(),
+            "open_fds": get_open_fd_count(),
+            "scratch_bytes": get_directory_size(self._scratch_directory),
+            "units": units,
+        }
+        with self._lock:
+            self._samples.append(sample)
+        return sample
+
+    def get_samples(self) -> List[Dict]:
+        with self._lock:
+            return list(self._samples)
+
+    def run(self) -> None:
+        while True:
+            self.sample()
+            if self._stop.wait(self._interval):
+                break
+
+    def start(self) -> "ResourceSampler":
+        self._stop.clear()
+        self._thread = Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "ResourceSampler":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def get_peaks(self) -> Dict[str, Dict]:
+        """Get the peak value of each metric and the units being processed then
+
+        Returns:
+            Dict[str, Dict]: Peak value and units by metric
+        """
+        peaks = {}
+        for sample in self.get_samples():
+            for metric in METRICS:
+                value = sample[metric]
+                if value is None:
+                    continue
+                peak = peaks.get(metric)
+                if peak is None or value > peak["value"]:
+                    peaks[metric] = {"value": value, "units": sample["units"]}
+        return peaks
+
+    def save_csv(self, path: str) -> None:
+        """Save samples as a CSV timeline
+
+        Args:
+            path (str): Path of CSV file
+
+        Returns:
+            None
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(
+                f,
+                fieldnames=["timestamp", "elapsed_seconds", *METRICS, "units"],
+            )
+            writer.writeheader()
+            writer.writerows(self.get_samples())
+        logger.info(f"Saved resource samples to {path}")
+
+    def save_prometheus(self, path: str, prefix: str = "chc_ucsb") -> None:
+        """Save last and peak values of each metric in the Prometheus text format
+        for the node exporter textfile collector. The file is written under a
+        temporary name and renamed so that it is never read half written.
+
+        Args:
+            path (str): Path of textfile (should end in .prom)
+            prefix (str): Prefix of metric names. Defaults to chc_ucsb.
+
+        Returns:
+            None
+        """
+        samples = self.get_samples()
+        if not samples:
+            return
+        last = samples[-1]
+        peaks = self.get_peaks()
+        lines = []
+        for metric in METRICS:
+            name = f"{prefix}_{metric}"
+            lines.append(f"# HELP {name} Sampled {metric.replace('_', ' ')}")
+            lines.append(f"# TYPE {name} gauge")
+            if last[metric] is not None:
+                lines.append(f'{name}{{stat="last"}} {last[metric]}')
+            peak = peaks.get(metric)
+            if peak:
+                units = peak["units"].replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'{name}{{stat="peak",units="{units}"}} {peak["value"]}')
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as f:
+            f.write("\n".join(lines))
+            f.write("\n")
+        os.replace(temporary_path, path)
+        logger.info(f"Saved resource metrics to {path}")
@@ -0,0 +1,120 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from hdx.data.dataset import Dataset
+
+logger = logging.getLogger(__name__)
+
+# Fields that are lists of dictionaries compared by their names only
+_NAMED_LIST_FIELDS = ("tags", "groups")
+
+
+def _normalise(key: str, value: Any) -> Any:
+    if value is None:
+        return ""
+    if key in _NAMED_LIST_FIELDS:
+        return sorted(x["name"] for x in value)
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, (list, dict)):
+        return value
+    return str(value).strip()
+
+
+def diff_dataset_metadata(
+    dataset: Dataset, live_dataset: Optional[Dataset]
+) -> Dict[str, Tuple[Any, Any]]:
+    """Compare the metadata of a generated dataset with the dataset in HDX. Only
+    fields set in the generated dataset are compared and resources are ignored.
+
+    Args:
+        dataset (Dataset): Generated dataset
+        live_dataset (Optional[Dataset]): Dataset read from HDX if it exists
+
+    Returns:
+        Dict[str, Tuple[Any, Any]]: Changed fields mapped to (live, generated)
+    """
+    changes = {}
+    for key, value in dataset.data.items():
+        if key == "resources":
+            continue
+        live_value = live_dataset.data.get(key) if live_dataset else None
+        if _normalise(key, live_value) != _normalise(key, value):
+            changes[key] = (live_value, value)
+    return changes
+
+
+def log_metadata_diff(name: str, changes: Dict[str, Tuple[Any, Any]]) -> None:
+    """Log the result of diff_dataset_metadata
+
+    Args:
+        name (str): Dataset name
+        changes (Dict[str, Tuple[Any, Any]]): Changed fields
+
+    Returns:
+        None
+    """
+    if not changes:
+        logger.info(f"Metadata of {name} unchanged")
+        return
+    for key, (live_value, value) in changes.items():
+        logger.info(f"Metadata of {name} changed: {key}: {live_value!r} -> {value!r}")
+
+
+def finalise_resources(
+    name: str,
+    resource_ids: List[str],
+    metadata_unchanged: bool,
+    live_resource_ids: Optional[List[str]],
+    updated_by_script: str,
+    batch: str,
+) -> int:
+    """Make the resources of the dataset in HDX exactly those given in the given
+    order using the fewest writes. If the dataset already had exactly these
+    resources in order, nothing is written. If only the order differs and the
+    metadata is unchanged, resources are reordered. Otherwise, the dataset is
+    rewritten removing any additional resources. Raises a ValueError without
+    writing if any of the given resources are not in HDX (eg. lost to concurrent
+    writes) as the dataset would otherwise be published incomplete.
+
+    Args:
+        name (str): Dataset name
+        resource_ids (List[str]): Resource ids in the required order
+        metadata_unchanged (bool): Whether dataset metadata is unchanged in HDX
+        live_resource_ids (Optional[List[str]]): Resource ids in HDX before upload
+        updated_by_script (str): Script name for updated_by_script field
+        batch (str): Batch UUID
+
+    Returns:
+        int: Number of dataset writes made
+    """
+    if live_resource_ids == resource_ids:
+        logger.info(f"Resources of {name} already in order")
+        return 0
+    dataset = Dataset.read_from_hdx(name)
+    current_ids = [r["id"] for r in dataset.get_resources()]
+    missing_ids = sorted(set(resource_ids) - set(current_ids))
+    if missing_ids:
+        logger.error(f"Resources {', '.join(missing_ids)} of {name} are not in HDX")
+        raise ValueError(
+            f"{len(missing_ids)} resources of {name} are missing from HDX! Rerun the units that created them."
+        )
+    if current_ids == resource_ids:
+        logger.info(f"Resources of {name} already in order")
+        return 0
+    if metadata_unchanged and sorted(current_ids) == sorted(resource_ids):
+        logger.info(f"Reordering resources of {name}")
+        dataset.reorder_resources(resource_ids)
+        return 1
+    logger.info(f"Updating {name} removing additional resources")
+    new_resources = [r for r in dataset.get_resources() if r["id"] in resource_ids]
+    new_resources = sorted(new_resources, key=lambda r: resource_ids.index(r["id"]))
+    dataset.init_resources()
+    dataset.add_update_resources(new_resources, ignore_datasetid=True)
+    dataset.create_in_hdx(
+        remove_additional_resources=True,
+        hxl_update=False,
+        updated_by_script=updated_by_script,
+        batch=batch,
+    )
+    return 1
@@ -0,0 +1,163 @@
+import json
+import logging
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from hdx.data.resource import Resource
+
+logger = logging.getLogger(__name__)
+
+
+class RunReport:
+    """RunReport class that records the units processed in a run (or a shard of a
+    run) and the resources created for each so that they can be merged and
+    checked afterwards"""
+
+    def __init__(self, shard_index: int = 0, shard_count: int = 1):
+        """RunReport constructor
+
+        Args:
+            shard_index (int): Index of shard. Defaults to 0.
+            shard_count (int): Number of shards. Defaults to 1.
+        """
+        self.data: Dict[str, Any] = {
+            "shard_index": shard_index,
+            "shard_count": shard_count,
+            "units": [],
+        }
+        self._lock = Lock()
+
+    def add_unit(
+        self,
+        variable: str,
+        scenario: str,
+        unit_index: int,
+        product: str,
+        month: int,
+        resources: List[Resource],
+        checksums: Optional[Dict[str, Tuple[int, str]]] = None,
+    ) -> None:
+        """Record the resources created in HDX for a unit replacing any earlier
+        record of the unit eg. from before it was re-uploaded. The size and hash
+        of each resource are those computed locally from its file if given in
+        checksums and otherwise those returned by HDX.
+
+        Args:
+            variable (str): Variable
+            scenario (str): Scenario
+            unit_index (int): Index of unit in canonical order of dataset
+            product (str): Product
+            month (int): Month
+            resources (List[Resource]): Resources created in HDX
+            checksums (Optional[Dict[str, Tuple[int, str]]]): Local size and hash by resource name. Defaults to None.
+
+        Returns:
+            None
+        """
+        if checksums is None:
+            checksums = {}
+        unit_resources = []
+        for resource in resources:
+            size, hash = checksums.get(
+                resource["name"], (resource.get("size"), resource.get("hash"))
+            )
+            unit_resources.append(
+                {
+                    "name": resource["name"],
+                    "id": resource["id"],
+                    "size": size,
+                    "hash": hash,
+                }
+            )
+        with self._lock:
+            self.data["units"] = [
+                unit
+                for unit in self.data["units"]
+                if (unit["variable"], unit["scenario"], unit["unit_index"])
+                != (variable, scenario, unit_index)
+            ]
+            self.data["units"].append(
+                {
+                    "variable": variable,
+                    "scenario": scenario,
+                    "unit_index": unit_index,
+                    "product": product,
+                    "month": month,
+                    "resources": unit_resources,
+                }
+            )
+
+    def set_compression(self, variable: str, product: str, compression: Dict) -> None:
+        """Record the zip compression chosen for a product
+
+        Args:
+            variable (str): Variable
+            product (str): Product
+            compression (Dict): Compression policy, method and any measurements
+
+        Returns:
+            None
+        """
+        self.data.setdefault("compression", {}).setdefault(variable, {})[product] = (
+            compression
+        )
+
+    def set_verification(self, name: str, failures: List[Dict]) -> None:
+        """Record the resources of a dataset that failed verification after
+        publishing
+
+        Args:
+            name (str): Dataset name
+            failures (List[Dict]): Failures from ResourceVerifier.verify
+
+        Returns:
+            None
+        """
+        self.data.setdefault("verification", {})[name] = failures
+
+    def get_units(self, variable: str, scenario: str) -> List[Dict]:
+        """Get units recorded for variable and scenario sorted in canonical order
+
+        Args:
+            variable (str): Variable
+            scenario (str): Scenario
+
+        Returns:
+            List[Dict]: Units
+        """
+        units = [
+            unit
+            for unit in self.data["units"]
+            if unit["variable"] == variable and unit["scenario"] == scenario
+        ]
+        return sorted(units, key=lambda unit: unit["unit_index"])
+
+    def save(self, path: str) -> None:
+        """Save report as JSON
+
+        Args:
+            path (str): Path of JSON file
+
+        Returns:
+            None
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.data, f, indent=2)
+        logger.info(f"Saved run report to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> "RunReport":
+        """Load report from JSON
+
+        Args:
+            path (str): Path of JSON file
+
+        Returns:
+            RunReport: Loaded report
+        """
+        report = cls()
+        with open(path) as f:
+            report.data = json.load(f)
+        return report
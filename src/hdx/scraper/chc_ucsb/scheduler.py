@@ -0,0 +1,148 @@
+import logging
+from glob import glob
+from os.path import join
+from typing import Dict, List, Optional, Tuple
+
+from hdx.scraper.chc_ucsb.report import RunReport
+from hdx.scraper.chc_ucsb.tiff_download import TIFFDownload
+from hdx.scraper.chc_ucsb.work_graph import WorkGraph
+
+logger = logging.getLogger(__name__)
+
+
+def load_previous_report(report_dir: str) -> Optional[RunReport]:
+    """Load the run report or shard reports of the previous run combined into one
+    report with the units and compression decisions of all of them
+
+    Args:
+        report_dir (str): Directory of run or shard reports
+
+    Returns:
+        Optional[RunReport]: Previous report or None if there isn't one
+    """
+    paths = sorted(glob(join(report_dir, "*.json")))
+    if not paths:
+        return None
+    previous_report = RunReport()
+    for path in paths:
+        report = RunReport.load(path)
+        previous_report.data["units"].extend(report.data["units"])
+        for variable, products in report.data.get("compression", {}).items():
+            for product, compression in products.items():
+                previous_report.data.setdefault("compression", {}).setdefault(
+                    variable, {}
+                ).setdefault(product, compression)
+    return previous_report
+
+
+class Scheduler:
+    """Scheduler class that orders the (product, month) units of a dataset largest
+    first using a cost model so that the heaviest units are not left until the end
+    of a concurrent run. Costs are either the sizes of the resources of each unit in
+    the previous run report or the sizes of the unit's tifs on the server."""
+
+    def __init__(
+        self,
+        tiff_download: TIFFDownload,
+        work_graph: WorkGraph,
+        cost_source: str = "report",
+        previous_report: Optional[RunReport] = None,
+    ):
+        """Scheduler constructor
+
+        Args:
+            tiff_download (TIFFDownload): TIFFDownload object for listings
+            work_graph (WorkGraph): Work graph
+            cost_source (str): report, listing or none. Defaults to report.
+            previous_report (Optional[RunReport]): Previous run report. Defaults to None.
+        """
+        if cost_source not in ("report", "listing", "none"):
+            raise ValueError(f"Unknown cost source {cost_source}!")
+        self._tiff_download = tiff_download
+        self._work_graph = work_graph
+        self._cost_source = cost_source
+        self._previous_report = previous_report
+
+    def get_report_costs(
+        self, variable: str, scenario: str
+    ) -> Dict[Tuple[str, int], int]:
+        """Get cost of each unit from the sizes of its resources in the previous
+        run report
+
+        Args:
+            variable (str): Variable
+            scenario (str): Scenario
+
+        Returns:
+            Dict[Tuple[str, int], int]: Cost of each unit in bytes
+        """
+        costs = {}
+        if not self._previous_report:
+            return costs
+        for unit in self._previous_report.get_units(variable, scenario):
+            sizes = [resource["size"] for resource in unit["resources"]]
+            if all(sizes):
+                costs[(unit["product"], unit["month"])] = sum(sizes)
+        return costs
+
+    def get_listing_costs(
+        self, variable: str, scenario: str, units: List[Tuple[str, int]]
+    ) -> Dict[Tuple[str, int], int]:
+        """Get cost of each unit from the sizes of its tifs on the server
+
+        Args:
+            variable (str): Variable
+            scenario (str): Scenario
+            units (List[Tuple[str, int]]): (product, month) units
+
+        Returns:
+            Dict[Tuple[str, int], int]: Cost of each unit in bytes
+        """
+        base_url = self._work_graph.get_variable_configuration(variable)["base_url"]
+        costs = {}
+        # One listing per month covers all products
+        for month in sorted({month for _, month in units}):
+            sizes = self._tiff_download.list_sizes(f"{base_url}/{scenario}/{month:02d}")
+            for product, unit_month in units:
+                if unit_month != month:
+                    continue
+                costs[(product, month)] = sum(
+                    size for filename, size in sizes.items() if product in filename
+                )
+        return costs
+
+    def get_costs(
+        self, variable: str, scenario: str, units: List[Tuple[str, int]]
+    ) -> Dict[Tuple[str, int], int]:
+        """Get cost of each unit
+
+        Args:
+            variable (str): Variable
+            scenario (str): Scenario
+            units (List[Tuple[str, int]]): (product, month) units
+
+        Returns:
+            Dict[Tuple[str, int], int]: Cost of each unit in bytes
+        """
+        if self._cost_source == "report":
+            return self.get_report_costs(variable, scenario)
+        if self._cost_source == "listing":
+            return self.get_listing_costs(variable, scenario, units)
+        return {}
+
+    def order(
+        self, variable: str, scenario: str, units: List[Tuple[str, int]]
+    ) -> List[Tuple[str, int]]:
+        """Order units largest first keeping canonical order between units of
+        equal or unknown cost
+
+        Args:
+            variable (str): Variable
+            scenario (str): Scenario
+            units (List[Tuple[str, int]]): (product, month) units in canonical order
+
+        Returns:
+            List[Tuple[str, int]]: Units in processing order
+        """
+        costs = self.get_costs(variable, scenario, units)
+        return sorted(units, key=lambda unit: -costs.get(unit, 0))
@@ -0,0 +1,88 @@
+import logging
+from glob import glob
+from os.path import join
+from typing import Dict, List, Tuple
+
+from hdx.scraper.chc_ucsb.report import RunReport
+from hdx.scraper.chc_ucsb.work_graph import WorkGraph
+
+logger = logging.getLogger(__name__)
+
+
+def shard_units(
+    work_graph: WorkGraph,
+    shard_index: int,
+    shard_count: int,
+) -> Dict[Tuple[str, str], List[Tuple[str, int]]]:
+    """Deterministically split the (variable, scenario, product, month) units of the
+    work graph between shards. Whole datasets are assigned to shards so that no
+    two shards write to the same dataset in HDX at the same time (concurrent
+    resource creation in one dataset can lose resources). Datasets are taken in
+    canonical order and each goes to the shard with the fewest units so far.
+
+    Args:
+        work_graph (WorkGraph): Work graph
+        shard_index (int): Index of shard from 0 to shard_count - 1
+        shard_count (int): Number of shards
+
+    Returns:
+        Dict[Tuple[str, str], List[Tuple[str, int]]]: Units of this shard by
+        (variable, scenario)
+    """
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Invalid shard {shard_index} of {shard_count}!")
+    shard = {}
+    shard_sizes = [0] * shard_count
+    for variable, scenario in work_graph.get_datasets():
+        dataset_units = work_graph.get_units(variable)
+        smallest_shard = shard_sizes.index(min(shard_sizes))
+        shard_sizes[smallest_shard] += len(dataset_units)
+        if smallest_shard == shard_index:
+            shard[(variable, scenario)] = list(dataset_units)
+    if not shard:
+        logger.warning(
+            f"Shard {shard_index} of {shard_count} has no datasets. Use at most as many shards as datasets."
+        )
+    return shard
+
+
+def get_shard_report_path(report_dir: str, shard_index: int, shard_count: int) -> str:
+    return join(report_dir, f"shard_{shard_index}_of_{shard_count}.json")
+
+
+def merge_shard_reports(
+    report_dir: str, work_graph: WorkGraph
+) -> Dict[Tuple[str, str], List[str]]:
+    """Combine shard reports into the canonical resource ids of each dataset
+    checking that every unit was processed by exactly one shard
+
+    Args:
+        report_dir (str): Directory of shard reports
+        work_graph (WorkGraph): Work graph
+
+    Returns:
+        Dict[Tuple[str, str], List[str]]: Resource ids in canonical order by
+        (variable, scenario)
+    """
+    merged = RunReport()
+    shard_counts = set()
+    for path in sorted(glob(join(report_dir, "shard_*_of_*.json"))):
+        report = RunReport.load(path)
+        shard_counts.add(report.data["shard_count"])
+        merged.data["units"].extend(report.data["units"])
+    if len(shard_counts) != 1:
+        raise ValueError(f"Missing or inconsistent shard reports in {report_dir}!")
+    resource_ids = {}
+    for variable, scenario in work_graph.get_datasets():
+        number_of_units = len(work_graph.get_units(variable))
+        units = merged.get_units(variable, scenario)
+        unit_indices = [unit["unit_index"] for unit in units]
+        if unit_indices != list(range(number_of_units)):
+            missing = sorted(set(range(number_of_units)) - set(unit_indices))
+            raise ValueError(
+                f"Shard reports for {variable} {scenario} are missing units {missing} or have duplicates!"
+            )
+        resource_ids[(variable, scenario)] = [
+            resource["id"] for unit in units for resource in unit["resources"]
+        ]
+    return resource_ids
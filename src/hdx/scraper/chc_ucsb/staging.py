@@ -0,0 +1,89 @@
+import fcntl
+import logging
+import os
+from pathlib import Path
+from shutil import copy2, copystat
+from typing import Dict, Union
+
+logger = logging.getLogger(__name__)
+
+# ioctl that clones a file's extents on filesystems with copy-on-write support eg.
+# btrfs and XFS. Not exposed by all builds of the fcntl module.
+_FICLONE = getattr(fcntl, "FICLONE", 0x40049409)
+
+
+def reflink(source: Union[Path, str], destination: Union[Path, str]) -> None:
+    """Create destination as a copy-on-write clone of source that shares its data
+    blocks. Raises OSError if the filesystem does not support it.
+
+    Args:
+        source (Union[Path, str]): Source file
+        destination (Union[Path, str]): Destination file
+
+    Returns:
+        None
+    """
+    try:
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+    except OSError:
+        Path(destination).unlink(missing_ok=True)
+        raise
+    copystat(source, destination)
+
+
+def link_or_copy(source: Union[Path, str], destination: Union[Path, str]) -> str:
+    """Place source at destination without copying its data if possible. A hard
+    link is tried first, then a reflink and finally a copy. Staged files are only
+    read and then removed and rsync replaces changed files by renaming, so sharing
+    an inode with the source is safe. Modification times are kept in every case.
+
+    Args:
+        source (Union[Path, str]): Source file
+        destination (Union[Path, str]): Destination file
+
+    Returns:
+        str: Method used: hardlink, reflink or copy
+    """
+    try:
+        os.link(source, destination)
+        return "hardlink"
+    except OSError:
+        pass
+    try:
+        reflink(source, destination)
+        return "reflink"
+    except OSError:
+        pass
+    copy2(source, destination)
+    return "copy"
+
+
+def link_files(
+    source_directory: Path, destination_directory: Path, pattern: str
+) -> Dict[str, int]:
+    """Stage the files in source directory matching pattern into destination
+    directory with link_or_copy, replacing any existing files
+
+    Args:
+        source_directory (Path): Directory of files eg. mirror
+        destination_directory (Path): Directory to stage files in
+        pattern (str): Glob pattern of files to stage
+
+    Returns:
+        Dict[str, int]: Number of files staged by each method
+    """
+    destination_directory.mkdir(parents=True, exist_ok=True)
+    methods = {}
+    for path in sorted(source_directory.glob(pattern)):
+        if not path.is_file():
+            continue
+        destination = destination_directory.joinpath(path.name)
+        destination.unlink(missing_ok=True)
+        method = link_or_copy(path, destination)
+        methods[method] = methods.get(method, 0) + 1
+    summary = ", ".join(f"{number} by {method}" for method, number in methods.items())
+    logger.info(
+        f"Staged {pattern} from {source_directory} in {destination_directory}: {summary or 'no files'}"
+    )
+    return methods
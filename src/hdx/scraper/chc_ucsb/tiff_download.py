@@ -1,17 +1,48 @@
 import asyncio
 import logging
+from collections import deque
 from pathlib import Path
 from timeit import default_timer as timer
-from typing import List
+from typing import Dict, List, Optional
+
+from hdx.scraper.chc_ucsb.bandwidth import BandwidthGovernor
 
 logger = logging.getLogger(__name__)
 
 
 class TIFFDownload:
-    """TIFFDownload class"""
+    """TIFFDownload class. rsync output is either all logged (full) or kept in a
+    ring buffer for each transfer (summary) with a summary line logged on success,
+    every sample_every-th line logged if set and the buffered tail logged on
+    failure."""
+
+    def __init__(
+        self,
+        governor: Optional[BandwidthGovernor] = None,
+        log_mode: str = "full",
+        buffer_lines: int = 1000,
+        tail_lines: int = 50,
+        sample_every: int = 0,
+    ):
+        """TIFFDownload constructor
+
+        Args:
+            governor (Optional[BandwidthGovernor]): Bandwidth governor for --bwlimit. Defaults to None.
+            log_mode (str): full or summary. Defaults to full.
+            buffer_lines (int): Lines of rsync output kept per transfer. Defaults to 1000.
+            tail_lines (int): Lines logged on failure in summary mode. Defaults to 50.
+            sample_every (int): Log every nth line in summary mode, 0 for none. Defaults to 0.
+        """
+        if log_mode not in ("full", "summary"):
+            raise ValueError(f"Unknown rsync log mode {log_mode}!")
+        self._governor = governor
+        self._log_mode = log_mode
+        self._buffer_lines = buffer_lines
+        self._tail_lines = tail_lines
+        self._sample_every = sample_every
 
     async def run_rsync(
-        self, source: str, tif_directory: Path, include: str
+        self, source: str, tif_directory: Path, include: str, delete: bool = False
     ) -> List[str]:
         """Runs rsync asynchronously to get output and error streams
 
@@ -19,15 +50,22 @@ class TIFFDownload:
             source (str): Source path
             tif_directory (Path): tif directory
             include (str): Files to include
+            delete (bool): Delete included files not in source. Defaults to False.
 
         Returns:
             List[str]: List of paths
         """
+        args = ["-avv", f"--include={include}", "--exclude=*"]
+        if delete:
+            # Files excluded by the filter are protected from deletion
+            args.append("--delete")
+        if self._governor:
+            bwlimit = self._governor.get_rsync_bwlimit()
+            if bwlimit:
+                args.append(f"--bwlimit={bwlimit}")
         process = await asyncio.create_subprocess_exec(
             "rsync",
-            "-avv",
-            f"--include={include}",
-            "--exclude=*",
+            *args,
             f"{source}/",
             f"{tif_directory}/",
             stdout=asyncio.subprocess.PIPE,
@@ -35,33 +73,108 @@ class TIFFDownload:
         )
 
         paths = []
+        buffer = deque(maxlen=self._buffer_lines)
+        number_of_lines = 0
+        summary = None
         async for line in process.stdout:
             line = line.decode().strip()
-            logger.info(line)
-            if "tif" in line:
+            number_of_lines += 1
+            if self._log_mode == "full":
+                logger.info(line)
+            else:
+                buffer.append(line)
+                if self._sample_every and number_of_lines % self._sample_every == 0:
+                    logger.info(f"rsync {source} line {number_of_lines}: {line}")
+                if line.startswith("sent "):
+                    summary = line
+            # Files already up to date in the destination (eg. a mirror) are
+            # listed but not transferred
+            if (
+                "tif" in line
+                and not line.endswith(" is uptodate")
+                and not line.startswith("deleting ")
+            ):
                 tif_filename = line.split()[0]
                 paths.append(tif_filename)
 
         async for line in process.stderr:
             logger.error(line.decode().strip())
 
-        await process.wait()
+        returncode = await process.wait()
 
+        if self._log_mode == "summary":
+            if returncode:
+                tail = list(buffer)[-self._tail_lines :]
+                logger.error(
+                    f"rsync {source} failed with exit code {returncode}. Last {len(tail)} of {number_of_lines} lines:"
+                )
+                for line in tail:
+                    logger.error(line)
+            else:
+                logger.info(
+                    f"rsync {source}: {len(paths)} tifs, {number_of_lines} lines of output. {summary or ''}"
+                )
         return paths
 
-    def process(self, source: str, tif_directory: Path, include: str) -> List[str]:
+    def process(
+        self, source: str, tif_directory: Path, include: str, delete: bool = False
+    ) -> List[str]:
         """Runs rsync asynchronously to get output and error streams
 
         Args:
             source (str): Source path
             tif_directory (Path): tif directory
             include (str): Files to include
+            delete (bool): Delete included files not in source. Defaults to False.
 
         Returns:
             List{str]: List of paths
         """
 
         start_time = timer()
-        result = asyncio.run(self.run_rsync(source, tif_directory, include))
+        result = asyncio.run(self.run_rsync(source, tif_directory, include, delete))
         logger.info(f"Execution time: {timer() - start_time} seconds")
         return result
+
+    async def run_rsync_list(self, source: str) -> Dict[str, int]:
+        """Runs rsync asynchronously to list the files in the source without
+        downloading them
+
+        Args:
+            source (str): Source path
+
+        Returns:
+            Dict[str, int]: Dictionary of filename to size in bytes
+        """
+        process = await asyncio.create_subprocess_exec(
+            "rsync",
+            "--list-only",
+            f"{source}/",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+
+        sizes = {}
+        async for line in process.stdout:
+            # eg. -rw-r--r--  12,345,678 2021/01/01 12:00:00 Daily_Tmax_1983_01.tif
+            fields = line.decode().split(maxsplit=4)
+            if len(fields) == 5 and fields[0].startswith("-"):
+                sizes[fields[4].strip()] = int(fields[1].replace(",", ""))
+
+        async for line in process.stderr:
+            logger.error(line.decode().strip())
+
+        await process.wait()
+
+        return sizes
+
+    def list_sizes(self, source: str) -> Dict[str, int]:
+        """Lists the files in the source with their sizes using rsync
+
+        Args:
+            source (str): Source path
+
+        Returns:
+            Dict[str, int]: Dictionary of filename to size in bytes
+        """
+        return asyncio.run(self.run_rsync_list(source))
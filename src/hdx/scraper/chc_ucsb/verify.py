@@ -0,0 +1,117 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from hdx.api.configuration import Configuration
+from hdx.data.hdxobject import HDXError
+from hdx.data.resource import Resource
+
+logger = logging.getLogger(__name__)
+
+
+class ResourceVerifier:
+    """ResourceVerifier class that checks after publishing that the resources
+    recorded in the run report exist in HDX with the size and hash computed
+    locally when each file was built. Resource metadata is read concurrently over
+    the connection pool of the HDX session."""
+
+    def __init__(
+        self, configuration: Optional[Configuration] = None, max_workers: int = 8
+    ):
+        """ResourceVerifier constructor
+
+        Args:
+            configuration (Optional[Configuration]): HDX configuration. Defaults to global configuration.
+            max_workers (int): Number of concurrent reads. Defaults to 8.
+        """
+        self._configuration = configuration
+        self._max_workers = max_workers
+
+    def verify_resource(self, unit: Dict, expected: Dict) -> Optional[Dict]:
+        """Compare a resource in HDX with the size and hash recorded for it
+
+        Args:
+            unit (Dict): Unit from run report
+            expected (Dict): Resource of unit from run report
+
+        Returns:
+            Optional[Dict]: Failure or None if the resource matches
+        """
+        failure = {
+            "variable": unit["variable"],
+            "scenario": unit["scenario"],
+            "unit_index": unit["unit_index"],
+            "product": unit["product"],
+            "month": unit["month"],
+            "name": expected["name"],
+            "id": expected["id"],
+        }
+        try:
+            resource = Resource.read_from_hdx(expected["id"], self._configuration)
+        except HDXError as ex:
+            return {**failure, "problem": "error", "error": str(ex)}
+        if resource is None:
+            return {**failure, "problem": "missing"}
+        changes = {}
+        for key in ("size", "hash"):
+            if expected.get(key) is None:
+                continue
+            if str(resource.get(key)) != str(expected[key]):
+                changes[key] = (expected[key], resource.get(key))
+        if changes:
+            return {**failure, "problem": "mismatch", "changes": changes}
+        return None
+
+    def verify(self, units: List[Dict]) -> List[Dict]:
+        """Verify the resources of the given run report units
+
+        Args:
+            units (List[Dict]): Units from run report
+
+        Returns:
+            List[Dict]: Failures in the order of the units
+        """
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = [
+                executor.submit(self.verify_resource, unit, resource)
+                for unit in units
+                for resource in unit["resources"]
+            ]
+        failures = [future.result() for future in futures]
+        failures = [failure for failure in failures if failure]
+        for failure in failures:
+            if failure["problem"] == "mismatch":
+                details = ", ".join(
+                    f"{key} {expected} expected but HDX has {actual}"
+                    for key, (expected, actual) in failure["changes"].items()
+                )
+            elif failure["problem"] == "error":
+                details = failure["error"]
+            else:
+                details = "not found in HDX"
+            logger.error(
+                f"Verification of {failure['name']} ({failure['id']}) failed: {details}"
+            )
+        logger.info(
+            f"Verified {len(futures)} resources: {len(futures) - len(failures)} ok, {len(failures)} failed"
+        )
+        return failures
+
+
+def get_failed_units(failures: List[Dict]) -> List[Tuple[str, int]]:
+    """Get the (product, month) units with missing or mismatched resources in
+    canonical order. Units whose resources could not be read are not included as
+    re-uploading them is unlikely to succeed either.
+
+    Args:
+        failures (List[Dict]): Failures from ResourceVerifier.verify
+
+    Returns:
+        List[Tuple[str, int]]: Units to re-upload
+    """
+    units = {}
+    for failure in failures:
+        if failure["problem"] == "error":
+            continue
+        units[failure["unit_index"]] = (failure["product"], failure["month"])
+    return [units[unit_index] for unit_index in sorted(units)]
@@ -0,0 +1,89 @@
+import logging
+from typing import Dict, List, Tuple
+
+from hdx.api.configuration import Configuration
+
+logger = logging.getLogger(__name__)
+
+_REQUIRED_KEYS = (
+    "base_url",
+    "dataset_name",
+    "dataset_title",
+    "dataset_description",
+    "resource_description",
+    "zip_file",
+    "scenarios",
+    "products",
+)
+
+
+class WorkGraph:
+    """WorkGraph class that expands the variable -> scenarios -> products -> months
+    graph declared under variables in the project configuration. Each variable and
+    scenario is a dataset and each product and month within it is a unit that
+    becomes one or more resources."""
+
+    def __init__(self, configuration: Configuration):
+        """WorkGraph constructor
+
+        Args:
+            configuration (Configuration): HDX configuration
+        """
+        self._variables: Dict[str, Dict] = configuration["variables"]
+        for variable, variable_configuration in self._variables.items():
+            missing = [
+                key for key in _REQUIRED_KEYS if key not in variable_configuration
+            ]
+            if missing:
+                raise ValueError(
+                    f"Variable {variable} is missing configuration {', '.join(missing)}!"
+                )
+
+    def get_variables(self) -> List[str]:
+        """Get variables in configuration order
+
+        Returns:
+            List[str]: Variables
+        """
+        return list(self._variables)
+
+    def get_variable_configuration(self, variable: str) -> Dict:
+        """Get configuration of variable
+
+        Args:
+            variable (str): Variable
+
+        Returns:
+            Dict: Variable configuration
+        """
+        return self._variables[variable]
+
+    def get_datasets(self) -> List[Tuple[str, str]]:
+        """Get (variable, scenario) pairs, one per dataset, in canonical order
+
+        Returns:
+            List[Tuple[str, str]]: (variable, scenario) pairs
+        """
+        return [
+            (variable, scenario)
+            for variable, variable_configuration in self._variables.items()
+            for scenario in variable_configuration["scenarios"]
+        ]
+
+    def get_units(self, variable: str) -> List[Tuple[str, int]]:
+        """Get (product, month) units of each dataset of variable in canonical
+        order which is the order of the resources in the dataset
+
+        Args:
+            variable (str): Variable
+
+        Returns:
+            List[Tuple[str, int]]: (product, month) units
+        """
+        variable_configuration = self._variables[variable]
+        months = variable_configuration.get("months", range(1, 13))
+        return [
+            (product, month)
+            for product in variable_configuration["products"]
+            for month in months
+        ]
@@ -0,0 +1,52 @@
+import os
+from pathlib import Path
+
+from hdx.utilities.path import temp_dir
+
+from hdx.scraper.chc_ucsb.artifact_cache import ArtifactCache
+
+
+class TestArtifactCache:
+    def test_artifact_cache(self):
+        with temp_dir(
+            "TestCHD_UCSB_artifact_cache",
+            delete_on_success=True,
+            delete_on_failure=False,
+        ) as tempdir:
+            tif_directory = Path(tempdir, "tifs")
+            tif_directory.mkdir()
+            tif_path = tif_directory.joinpath("a.tif")
+            tif_path.write_bytes(b"1234")
+            cache = ArtifactCache(Path(tempdir, "cache"), max_size=10)
+            key = cache.key(tif_directory)
+            assert key == cache.key(tif_directory)
+            assert key != cache.key(tif_directory, "store")
+            zip_path = str(Path(tempdir, "a.zip"))
+            assert cache.get(key, zip_path) is False
+
+            Path(zip_path).write_bytes(b"zipped")
+            cache.put(key, zip_path)
+            os.remove(zip_path)
+            assert cache.get(key, zip_path) is True
+            assert Path(zip_path).read_bytes() == b"zipped"
+
+            # A different size or modification time changes the key
+            tif_path.write_bytes(b"12345")
+            key2 = cache.key(tif_directory)
+            assert key2 != key
+            os.utime(tif_path, ns=(0, 0))
+            assert cache.key(tif_directory) != key2
+
+            # Touch the first entry so the second is least recently used
+            zip_path2 = str(Path(tempdir, "b.zip"))
+            Path(zip_path2).write_bytes(b"zip2")
+            cache.put(key2, zip_path2)
+            os.utime(Path(tempdir, "cache", f"{key2}.zip"), (1, 1))
+            assert cache.get(key, zip_path) is True
+            key3 = cache.key(tif_directory, "3")
+            zip_path3 = str(Path(tempdir, "c.zip"))
+            Path(zip_path3).write_bytes(b"zip3")
+            cache.put(key3, zip_path3)
+            assert cache.get(key2, zip_path2) is False
+            assert cache.get(key, zip_path) is True
+            assert cache.get(key3, zip_path3) is True
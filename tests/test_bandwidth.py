@@ -0,0 +1,96 @@
+from unittest.mock import patch
+
+from hdx.scraper.chc_ucsb.bandwidth import BandwidthGovernor, TokenBucket
+
+
+class TestBandwidth:
+    def test_token_bucket(self):
+        bucket = TokenBucket(None)
+        assert bucket.consume(1000000) == 0.0
+        utilisation = bucket.get_utilisation()
+        assert utilisation["total_bytes"] == 1000000
+        assert utilisation["limit_bytes_per_second"] is None
+        assert utilisation["utilisation"] is None
+
+        with patch("hdx.scraper.chc_ucsb.bandwidth.sleep") as mock_sleep:
+            with patch("hdx.scraper.chc_ucsb.bandwidth.monotonic", return_value=100.0):
+                bucket = TokenBucket(1000, window=10)
+                # The burst is available immediately
+                assert bucket.consume(1000) == 0.0
+                # Larger than the bucket so waits for the deficit
+                assert bucket.consume(3000) == 3.0
+                mock_sleep.assert_called_once_with(3.0)
+                # Later consumers wait behind it
+                assert bucket.consume(500) == 3.5
+                utilisation = bucket.get_utilisation()
+        assert utilisation == {
+            "total_bytes": 4500,
+            "window_bytes": 4500,
+            "bytes_per_second": 450.0,
+            "limit_bytes_per_second": 1000,
+            "utilisation": 0.45,
+        }
+
+    def test_governor(self):
+        governor = BandwidthGovernor()
+        assert governor.get_rsync_bwlimit() is None
+        assert governor.throttle_upload(10000) == 0.0
+
+        governor = BandwidthGovernor(
+            ingress_rate=4 * 1024 * 1024, egress_rate=1000, max_transfers=4
+        )
+        assert governor.get_rsync_bwlimit() == 1024
+        with patch("hdx.scraper.chc_ucsb.bandwidth.sleep"):
+            governor.throttle_download(2048)
+            assert governor.throttle_upload(1500) > 0
+        utilisation = governor.get_utilisation()
+        assert utilisation["ingress"]["total_bytes"] == 2048
+        assert utilisation["egress"]["total_bytes"] == 1500
+        assert utilisation["egress"]["limit_bytes_per_second"] == 1000
+
+    def test_throttle_download_at_limit(self):
+        with patch("hdx.scraper.chc_ucsb.bandwidth.sleep") as mock_sleep:
+            with patch("hdx.scraper.chc_ucsb.bandwidth.monotonic") as mock_monotonic:
+                mock_monotonic.return_value = 100.0
+                governor = BandwidthGovernor(ingress_rate=1000000)
+                # rsync held to the limit fetched 2MB over 2s so no extra wait
+                mock_monotonic.return_value = 102.0
+                assert governor.throttle_download(2000000, 2.0) == 0.0
+                # Back to back transfers at the limit never wait either
+                for second in range(104, 120, 2):
+                    mock_monotonic.return_value = float(second)
+                    assert governor.throttle_download(2000000, 2.0) == 0.0
+                mock_sleep.assert_not_called()
+                # Only the overshoot beyond the limit is charged: 1MB of burst
+                # is available so 3MB over 1s waits for 1s
+                mock_monotonic.return_value = 121.0
+                assert governor.throttle_download(3000000, 1.0) == 1.0
+                mock_sleep.assert_called_once_with(1.0)
+
+                # With concurrent transfers each rsync gets an equal share
+                governor = BandwidthGovernor(ingress_rate=1000000, max_transfers=2)
+                assert governor.throttle_download(1000000, 2.0) == 0.0
+                assert governor.throttle_download(1000000, 2.0) == 0.0
+        assert governor.get_utilisation()["ingress"]["total_bytes"] == 2000000
+
+    def test_from_configuration(self):
+        configuration = {
+            "bandwidth": {
+                "ingress_bytes_per_second": 8 * 1024 * 1024,
+                "egress_bytes_per_second": 4000,
+            },
+            "scheduling": {"max_workers": 2},
+        }
+        governor = BandwidthGovernor.from_configuration(configuration)
+        assert governor.ingress.rate == 8 * 1024 * 1024
+        assert governor.egress.rate == 4000
+        assert governor.get_rsync_bwlimit() == 4096
+        # Shards running in parallel share the budgets equally
+        governor = BandwidthGovernor.from_configuration(configuration, 4)
+        assert governor.ingress.rate == 2 * 1024 * 1024
+        assert governor.egress.rate == 1000
+        assert governor.get_rsync_bwlimit() == 1024
+
+        governor = BandwidthGovernor.from_configuration({}, 4)
+        assert governor.ingress.rate is None
+        assert governor.egress.rate is None
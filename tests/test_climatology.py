@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import numpy
+import pytest
+import rasterio
+from hdx.utilities.path import temp_dir
+from rasterio.transform import from_origin
+
+from hdx.scraper.chc_ucsb.climatology import Climatology
+
+
+class TestClimatology:
+    def test_process(self):
+        with temp_dir(
+            "TestCHD_UCSB_climatology",
+            delete_on_success=True,
+            delete_on_failure=False,
+        ) as tempdir:
+            profile = {
+                "driver": "GTiff",
+                "dtype": "int16",
+                "count": 1,
+                "width": 70,
+                "height": 30,
+                "nodata": -9999,
+                "crs": "EPSG:4326",
+                "transform": from_origin(-180, 90, 0.05, 0.05),
+            }
+            tif_paths = []
+            for i, year in enumerate((1983, 1984, 1985)):
+                tif_path = Path(tempdir, f"Daily_Tmax_{year}_01_cnt_Tmaxgt30C.tif")
+                data = numpy.full((30, 70), i * 10, dtype="int16")
+                data[0, 0] = -9999
+                data[0, 1] = -9999 if i == 1 else i
+                with rasterio.open(tif_path, "w", **profile) as dst:
+                    dst.write(data, 1)
+                tif_paths.append(tif_path)
+            output_path = str(Path(tempdir, "climatology.tif"))
+            climatology = Climatology(["mean", "max", "sum"], block_size=16)
+            climatology.process(tif_paths, output_path)
+            with rasterio.open(output_path) as src:
+                assert src.count == 3
+                assert src.descriptions == ("mean", "max", "sum")
+                assert src.dtypes == ("float32", "float32", "float32")
+                mean, maximum, total = src.read()
+            assert mean[29, 69] == 10
+            assert maximum[15, 40] == 20
+            assert total[10, 10] == 30
+            assert numpy.isnan(mean[0, 0])
+            assert mean[0, 1] == 1
+            assert total[0, 1] == 2
+
+    def test_unknown_statistic(self):
+        with pytest.raises(ValueError):
+            Climatology(["median"])
+
+    def test_windows(self):
+        climatology = Climatology(["mean"], block_size=512)
+        windows = list(climatology.windows(7200, 1000))
+        assert len(windows) == 30
+        assert windows[-1].width == 7200 - 14 * 512
+        assert windows[-1].height == 1000 - 512
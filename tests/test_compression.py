@@ -0,0 +1,68 @@
+import os
+from pathlib import Path
+
+import pytest
+from hdx.utilities.path import temp_dir
+
+from hdx.scraper.chc_ucsb.compression import CompressionPolicy
+
+
+class TestCompression:
+    def test_compression_policy(self):
+        with pytest.raises(ValueError):
+            CompressionPolicy("zstd")
+        with temp_dir(
+            "TestCHD_UCSB_compression",
+            delete_on_success=True,
+            delete_on_failure=False,
+        ) as tempdir:
+            compressible = Path(tempdir, "compressible")
+            compressible.mkdir()
+            incompressible = Path(tempdir, "incompressible")
+            incompressible.mkdir()
+            for year in range(1983, 1989):
+                compressible.joinpath(f"{year}_cnt.tif").write_bytes(bytes(1024 * 1024))
+                incompressible.joinpath(f"{year}_mean.tif").write_bytes(
+                    os.urandom(256 * 1024)
+                )
+
+            policy = CompressionPolicy(
+                "store", {"cnt": "auto", "mean": "auto", "other": "deflate"}
+            )
+            assert policy.choose("Tmax", "other", compressible) == {
+                "policy": "deflate",
+                "method": "deflate",
+            }
+            assert policy.choose("Tmax", "unknown", compressible)["method"] == "store"
+
+            measurements = policy.sample(sorted(compressible.glob("*.tif")))
+            assert measurements["ratio"] < 0.01
+            measurements = policy.sample(sorted(incompressible.glob("*.tif")))
+            assert measurements["ratio"] == 1.0
+
+            decision = policy.choose("Tmax", "cnt", compressible)
+            assert decision["method"] == "deflate"
+            assert (
+                decision["estimated_deflate_seconds"]
+                < decision["estimated_store_seconds"]
+            )
+            assert policy.choose("Tmax", "mean", incompressible)["method"] == "store"
+            # The decision is kept for later units of the product
+            assert policy.choose("Tmax", "cnt", incompressible) is decision
+
+            # On a very fast link compressing costs more than it saves
+            policy = CompressionPolicy("auto")
+            policy.record_upload(1024 * 1024 * 1024 * 1024, 1.0)
+            assert policy.get_upload_speed() == 1024 * 1024 * 1024 * 1024
+            assert policy.choose("Tmax", "cnt", compressible)["method"] == "store"
+
+            # The method chosen in a previous run is reused so zips are unchanged
+            previous = {"Tmax": {"cnt": {"policy": "auto", "method": "store"}}}
+            policy = CompressionPolicy("auto", previous=previous)
+            assert policy.choose("Tmax", "cnt", compressible) == {
+                "policy": "auto",
+                "method": "store",
+            }
+            assert policy.choose("Tmax", "mean", compressible)["method"] == "deflate"
+            policy = CompressionPolicy("auto", previous=previous, rebenchmark=True)
+            assert policy.choose("Tmax", "cnt", compressible)["method"] == "deflate"
@@ -0,0 +1,151 @@
+import json
+from os.path import exists, join
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from hdx.api.configuration import Configuration
+from hdx.utilities.path import temp_dir
+
+from hdx.scraper.chc_ucsb.__main__ import main
+from hdx.scraper.chc_ucsb.fake_hdx import FakeHDX
+from hdx.scraper.chc_ucsb.metrics import MetricsStore
+from hdx.scraper.chc_ucsb.verify import ResourceVerifier
+
+
+class MyTIFFDownload:
+    def __init__(self, *args):
+        pass
+
+    @staticmethod
+    def process(source: str, tif_directory: Path, include: str, delete: bool = False):
+        tif_directory.mkdir(parents=True, exist_ok=True)
+        tif_directory.joinpath("test.tif").write_bytes(include.encode("utf-8") * 100)
+        return ["test.tif"]
+
+
+class FailingTIFFDownload(MyTIFFDownload):
+    @staticmethod
+    def process(source: str, tif_directory: Path, include: str, delete: bool = False):
+        raise OSError("No space left on device")
+
+
+class TestFakeHDX:
+    def test_publish(self, configuration, config_dir):
+        with temp_dir(
+            "TestCHD_UCSB_fake_hdx",
+            delete_on_success=True,
+            delete_on_failure=False,
+        ) as tempdir:
+            with FakeHDX(
+                error_rate=0.1,
+                seed=1,
+                organizations=("6e30eb6d-52f9-49de-b2cd-2d68fced05c5",),
+            ) as fake_hdx:
+                Configuration._create(
+                    user_agent="test",
+                    hdx_url=fake_hdx.url,
+                    hdx_key="fake",
+                    project_config_yaml=join(config_dir, "project_configuration.yaml"),
+                )
+                try:
+                    fake_configuration = Configuration.read()
+                    fake_configuration["run_report_dir"] = tempdir
+                    fake_configuration["metrics"]["history_file"] = join(
+                        tempdir, "history.jsonl"
+                    )
+                    variable_configuration = fake_configuration["variables"]["Tmax"]
+                    variable_configuration["scenarios"] = ["2030_SSP245"]
+                    variable_configuration["products"] = ["cnt_Tmaxgt30C"]
+                    variable_configuration["months"] = [1, 2, 3]
+                    with patch(
+                        "hdx.scraper.chc_ucsb.__main__.TIFFDownload", MyTIFFDownload
+                    ):
+                        main()
+                        package = fake_hdx.get_package("chc_ucsb_tmax_2030_ssp245")
+                        resources = package["resources"]
+                        assert [resource["name"] for resource in resources] == [
+                            "Daily_Tmax_cnt_Tmaxgt30C_01.zip",
+                            "Daily_Tmax_cnt_Tmaxgt30C_02.zip",
+                            "Daily_Tmax_cnt_Tmaxgt30C_03.zip",
+                        ]
+                        assert all(resource["size"] for resource in resources)
+                        ids = [resource["id"] for resource in resources]
+                        uploaded_bytes = fake_hdx.get_statistics()["uploaded_bytes"]
+
+                        # A rerun updates the same resources in place and only
+                        # re-uploads a resource that fails verification
+                        verify = ResourceVerifier.verify
+
+                        def corrupt_and_verify(self, units):
+                            if len(units) == 3:
+                                fake_configuration.remoteckan().call_action(
+                                    "resource_patch", {"id": ids[1], "hash": "corrupt"}
+                                )
+                            return verify(self, units)
+
+                        with patch.object(
+                            ResourceVerifier, "verify", corrupt_and_verify
+                        ):
+                            main()
+                        package = fake_hdx.get_package("chc_ucsb_tmax_2030_ssp245")
+                        assert [
+                            resource["id"] for resource in package["resources"]
+                        ] == ids
+                        statistics = fake_hdx.get_statistics()
+                        assert (
+                            statistics["uploaded_bytes"]
+                            == uploaded_bytes + package["resources"][1]["size"]
+                        )
+                finally:
+                    Configuration._configuration = configuration
+            assert statistics["calls"]["package_create"] == 1
+            assert "resource_delete" not in statistics["calls"]
+            assert sum(statistics["errors"].values()) > 0
+            with open(join(tempdir, "run_report.json")) as f:
+                report = json.load(f)
+            assert report["verification"] == {"chc_ucsb_tmax_2030_ssp245": []}
+            runs = MetricsStore(join(tempdir, "history.jsonl")).load()
+            assert len(runs) == 2
+            assert sum(stage["retries"] for run in runs for stage in run["stages"]) > 0
+            assert uploaded_bytes > 0
+
+    def test_failed_run_profiling(self, configuration, config_dir):
+        with temp_dir(
+            "TestCHD_UCSB_fake_hdx_failure",
+            delete_on_success=True,
+            delete_on_failure=False,
+        ) as tempdir:
+            with FakeHDX(
+                organizations=("6e30eb6d-52f9-49de-b2cd-2d68fced05c5",),
+            ) as fake_hdx:
+                Configuration._create(
+                    user_agent="test",
+                    hdx_url=fake_hdx.url,
+                    hdx_key="fake",
+                    project_config_yaml=join(config_dir, "project_configuration.yaml"),
+                )
+                try:
+                    fake_configuration = Configuration.read()
+                    fake_configuration["run_report_dir"] = tempdir
+                    fake_configuration["metrics"]["history_file"] = join(
+                        tempdir, "history.jsonl"
+                    )
+                    fake_configuration["profiling"] = {
+                        "enabled": True,
+                        "interval_seconds": 0.01,
+                        "csv_file": join(tempdir, "resources.csv"),
+                        "prometheus_file": join(tempdir, "resources.prom"),
+                    }
+                    with patch(
+                        "hdx.scraper.chc_ucsb.__main__.TIFFDownload",
+                        FailingTIFFDownload,
+                    ):
+                        with pytest.raises(OSError):
+                            main()
+                finally:
+                    Configuration._configuration = configuration
+            # Resource samples and metrics are exported even though the run failed
+            assert exists(join(tempdir, "resources.csv"))
+            assert exists(join(tempdir, "resources.prom"))
+            assert exists(join(tempdir, "history.jsonl"))
@@ -0,0 +1,109 @@
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from hdx.utilities.path import temp_dir
+
+from hdx.scraper.chc_ucsb.compare import main
+from hdx.scraper.chc_ucsb.metrics import MetricsStore, RetryCounter, RunMetrics
+
+
+class TestMetrics:
+    @staticmethod
+    def make_metrics(rsync_seconds: float, upload_seconds: float) -> RunMetrics:
+        metrics = RunMetrics()
+        metrics.record("Tmax", "2030_SSP245", "rsync", rsync_seconds / 2, 500)
+        metrics.record("Tmax", "2030_SSP245", "rsync", rsync_seconds / 2, 500)
+        metrics.record("Tmax", "2030_SSP245", "zip", 1.0, 0)
+        metrics.record("Tmax", "2030_SSP245", "upload", upload_seconds, 100)
+        return metrics
+
+    def test_run_metrics(self):
+        metrics = self.make_metrics(10.0, 4.0)
+        with pytest.raises(ValueError):
+            metrics.record("Tmax", "2030_SSP245", "unzip", 1.0, 0)
+        metrics.add_retries("Tmax", "2030_SSP245", "upload", 2)
+        assert metrics.get_stages() == [
+            {
+                "variable": "Tmax",
+                "scenario": "2030_SSP245",
+                "stage": "rsync",
+                "count": 2,
+                "seconds": 10.0,
+                "bytes": 1000,
+                "retries": 0,
+                "bytes_per_second": 100.0,
+            },
+            {
+                "variable": "Tmax",
+                "scenario": "2030_SSP245",
+                "stage": "upload",
+                "count": 1,
+                "seconds": 4.0,
+                "bytes": 100,
+                "retries": 2,
+                "bytes_per_second": 25.0,
+            },
+            {
+                "variable": "Tmax",
+                "scenario": "2030_SSP245",
+                "stage": "zip",
+                "count": 1,
+                "seconds": 1.0,
+                "bytes": 0,
+                "retries": 0,
+                "bytes_per_second": 0.0,
+            },
+        ]
+
+        retry_counter = RetryCounter()
+        response = MagicMock()
+        response.raw.retries.history = (1, 2)
+        retry_counter.hook(response)
+        response.raw.retries = None
+        retry_counter.hook(response)
+        assert retry_counter.count == 2
+
+    def test_compare(self):
+        with temp_dir(
+            "TestCHD_UCSB_metrics",
+            delete_on_success=True,
+            delete_on_failure=False,
+        ) as tempdir:
+            path = str(Path(tempdir, "history.jsonl"))
+            store = MetricsStore(path)
+            assert store.compare() == []
+            for rsync_seconds in (10.0, 12.0, 11.0):
+                store.append(self.make_metrics(rsync_seconds, 4.0), shard_index=0)
+            assert store.compare() == []
+            assert main(["--history-file", path]) == 0
+
+            # rsync slowed down by 50% against the median of 11 seconds
+            store.append(self.make_metrics(16.5, 4.5))
+            assert len(store.load()) == 4
+            regressions = store.compare(baseline_runs=3, threshold=0.25)
+            assert len(regressions) == 1
+            assert regressions[0]["stage"] == "rsync"
+            assert regressions[0]["slowdown"] == pytest.approx(0.5)
+            assert store.compare(baseline_runs=3, threshold=0.6) == []
+            assert main(["--history-file", path]) == 1
+
+            # The shards of a run are combined into one run: two shards each
+            # taking the baseline time per byte are not a regression
+            path = str(Path(tempdir, "shards.jsonl"))
+            store = MetricsStore(path)
+            for run_id, rsync_seconds in (("1", 10.0), ("2", 12.0), ("3", 11.0)):
+                for shard_index in range(2):
+                    store.append(
+                        self.make_metrics(rsync_seconds, 4.0),
+                        run_id=run_id,
+                        shard_index=shard_index,
+                        shard_count=2,
+                    )
+            store.append(self.make_metrics(1.0, 4.0), run_id="4", shard_index=0)
+            store.append(self.make_metrics(21.0, 4.0), run_id="4", shard_index=1)
+            runs = store.load_runs()
+            assert [run["run_id"] for run in runs] == ["1", "2", "3", "4"]
+            assert runs[3]["stages"][0]["seconds"] == 22.0
+            assert runs[3]["stages"][0]["bytes"] == 2000
+            assert store.compare(baseline_runs=3, threshold=0.25) == []
@@ -1,12 +1,21 @@
 from pathlib import Path
+from threading import Lock
+from time import sleep
+from unittest.mock import MagicMock, patch
 
+import numpy
 import pytest
+import rasterio
 from hdx.data.dataset import Dataset
 from hdx.data.resource import Resource
 from hdx.utilities.downloader import Download
 from hdx.utilities.path import temp_dir
 from hdx.utilities.retriever import Retrieve
+from rasterio.transform import from_origin
+from rasterio.windows import Window
 
+from hdx.scraper.chc_ucsb.bandwidth import BandwidthGovernor
+from hdx.scraper.chc_ucsb.metrics import RunMetrics
 from hdx.scraper.chc_ucsb.pipeline import Pipeline
 
 
@@ -17,9 +26,12 @@ class TestPipeline:
     def my_tiff_download(self):
         class MyTIFFDownload:
             @staticmethod
-            def process(source: str, tif_directory: Path, include: str):
+            def process(
+                source: str, tif_directory: Path, include: str, delete: bool = False
+            ):
                 file_path = tif_directory.joinpath("test.tif")
                 file_path.touch()
+                return ["test.tif"]
 
         return MyTIFFDownload
 
@@ -30,7 +42,7 @@ class TestPipeline:
             resource["id"] = resource["name"]
             self.actual_resources.append(resource)
             dataset["id"] = dataset["name"]
-            return dataset
+            return dataset, {resource["name"]: 2}
 
         return my_create_dataset_in_hdx
 
@@ -39,7 +51,7 @@ class TestPipeline:
         def my_create_resource_in_hdx(resource: Resource, dataset: Dataset):
             self.actual_resources.append(resource)
             resource["id"] = resource["name"]
-            return resource
+            return resource, 2
 
         return my_create_resource_in_hdx
 
@@ -68,8 +80,8 @@ class TestPipeline:
                     use_saved=True,
                 )
                 pipeline = Pipeline(my_tiff_download, configuration, retriever, tempdir)
-                scenario = configuration["scenarios"][0]
-                dataset = pipeline.generate_dataset(scenario)
+                scenario = configuration["variables"]["Tmax"]["scenarios"][0]
+                dataset = pipeline.generate_dataset("Tmax", scenario)
                 assert dataset == {
                     "dataset_date": "[2030-01-01T00:00:00 TO 2030-12-31T23:59:59]",
                     "groups": [{"name": "world"}],
@@ -140,7 +152,11 @@ class TestPipeline:
                     "2030 Scenario (CHC-CMIP6)",
                 }
                 pipeline.add_resources(
-                    dataset, scenario, create_dataset_in_hdx, create_resource_in_hdx
+                    dataset,
+                    "Tmax",
+                    scenario,
+                    create_dataset_in_hdx,
+                    create_resource_in_hdx,
                 )
                 # For test purposes dataset and resource ids have been set to names
                 # First resource won't have package id as it is added to dataset
@@ -557,3 +573,176 @@ class TestPipeline:
                         "name": "Daily_Tmax_monthly_mean_12.zip",
                     },
                 ]
+
+    def test_make_cog(self, configuration, input_dir, my_tiff_download):
+        with temp_dir(
+            "TestCHD_UCSB_cog",
+            delete_on_success=True,
+            delete_on_failure=False,
+        ) as tempdir:
+            with Download(user_agent="test") as downloader:
+                retriever = Retrieve(
+                    downloader=downloader,
+                    fallback_dir=tempdir,
+                    saved_dir=input_dir,
+                    temp_dir=tempdir,
+                    save=False,
+                    use_saved=True,
+                )
+                pipeline = Pipeline(my_tiff_download, configuration, retriever, tempdir)
+                tif_directory = Path(tempdir, "tifs")
+                tif_directory.mkdir()
+                cog_path = str(Path(tempdir, "test_cog.tif"))
+                with pytest.raises(ValueError):
+                    pipeline.make_cog(cog_path, tif_directory)
+                profile = {
+                    "driver": "GTiff",
+                    "dtype": "float32",
+                    "count": 1,
+                    "width": 600,
+                    "height": 300,
+                    "crs": "EPSG:4326",
+                    "transform": from_origin(-180, 90, 0.6, 0.6),
+                }
+                for year in (1984, 1983, 1985):
+                    with rasterio.open(
+                        tif_directory.joinpath(f"Daily_Tmax_{year}_01_test.tif"),
+                        "w",
+                        **profile,
+                    ) as dst:
+                        dst.write(numpy.full((300, 600), year, dtype="float32"), 1)
+                pipeline.make_cog(cog_path, tif_directory)
+                assert not Path(f"{cog_path}.stack.tif").exists()
+                with rasterio.open(cog_path) as src:
+                    assert src.count == 3
+                    assert src.is_tiled
+                    assert src.block_shapes[0] == (512, 512)
+                    assert src.overviews(1) != []
+                    assert src.descriptions == (
+                        "Daily_Tmax_1983_01_test",
+                        "Daily_Tmax_1984_01_test",
+                        "Daily_Tmax_1985_01_test",
+                    )
+                    window = Window(10, 20, 5, 5)
+                    assert src.read(3, window=window).max() == 1985
+
+    def test_make_zip_failure(self, configuration, input_dir, my_tiff_download):
+        with temp_dir(
+            "TestCHD_UCSB_zip_failure",
+            delete_on_success=True,
+            delete_on_failure=False,
+        ) as tempdir:
+            with Download(user_agent="test") as downloader:
+                retriever = Retrieve(
+                    downloader=downloader,
+                    fallback_dir=tempdir,
+                    saved_dir=input_dir,
+                    temp_dir=tempdir,
+                    save=False,
+                    use_saved=True,
+                )
+                cache_directory = Path(tempdir, "cache")
+                with patch.dict(
+                    configuration["artifact_cache"],
+                    {"directory": str(cache_directory)},
+                ):
+                    pipeline = Pipeline(
+                        my_tiff_download, configuration, retriever, tempdir
+                    )
+                tif_directory = Path(tempdir, "tifs")
+                tif_directory.mkdir()
+                tif_directory.joinpath("test.tif").write_bytes(b"1234")
+                zip_path = str(Path(tempdir, "test.zip"))
+
+                def create_subprocess(args, **kwargs):
+                    # Leave a partial zip behind as a failed build might
+                    Path(zip_path).write_bytes(b"PK")
+                    # Output is text as deterministic-zip is run with text=True
+                    return MagicMock(
+                        returncode=1, communicate=lambda: ("", "disk full")
+                    )
+
+                with patch(
+                    "hdx.scraper.chc_ucsb.pipeline.exec.create_subprocess",
+                    create_subprocess,
+                ):
+                    with pytest.raises(RuntimeError):
+                        pipeline.make_zip(zip_path, tif_directory)
+                assert not Path(zip_path).exists()
+                assert list(cache_directory.iterdir()) == []
+
+                # Real deterministic-zip given an invalid compression method
+                with pytest.raises(RuntimeError):
+                    pipeline.make_zip(zip_path, tif_directory, "invalid")
+                assert not Path(zip_path).exists()
+                assert list(cache_directory.iterdir()) == []
+
+    def test_add_resources_serialised(self, configuration, input_dir, my_tiff_download):
+        with temp_dir(
+            "TestCHD_UCSB_serialised",
+            delete_on_success=True,
+            delete_on_failure=False,
+        ) as tempdir:
+            with Download(user_agent="test") as downloader:
+                retriever = Retrieve(
+                    downloader=downloader,
+                    fallback_dir=tempdir,
+                    saved_dir=input_dir,
+                    temp_dir=tempdir,
+                    save=False,
+                    use_saved=True,
+                )
+                metrics = RunMetrics()
+                governor = BandwidthGovernor(egress_rate=1000)
+                with patch.dict(
+                    configuration["scheduling"],
+                    {"max_workers": 4, "cost_source": "none"},
+                ):
+                    pipeline = Pipeline(
+                        my_tiff_download,
+                        configuration,
+                        retriever,
+                        tempdir,
+                        governor=governor,
+                        metrics=metrics,
+                    )
+                scenario = configuration["variables"]["Tmax"]["scenarios"][0]
+                dataset = pipeline.generate_dataset("Tmax", scenario)
+                lock = Lock()
+                writes = {"active": 0, "max_active": 0}
+
+                def create_dataset_in_hdx(dataset: Dataset):
+                    for resource in dataset.get_resources():
+                        resource["id"] = resource["name"]
+                    return dataset, {}
+
+                def create_resource_in_hdx(resource: Resource, dataset: Dataset):
+                    with lock:
+                        writes["active"] += 1
+                        writes["max_active"] = max(
+                            writes["max_active"], writes["active"]
+                        )
+                    sleep(0.05)
+                    resource["id"] = resource["name"]
+                    with lock:
+                        writes["active"] -= 1
+                    return resource, 3
+
+                units = [("cnt_Tmaxgt30C", month) for month in range(1, 9)]
+                resource_ids = pipeline.add_resources(
+                    dataset,
+                    "Tmax",
+                    scenario,
+                    create_dataset_in_hdx,
+                    create_resource_in_hdx,
+                    units,
+                )
+                assert len(resource_ids) == 8
+                # Units are processed concurrently but writes to the dataset are not
+                assert writes["max_active"] == 1
+                # HDX skipped every file as unchanged so no uploads were timed
+                # or charged to the egress budget
+                assert "upload" not in [
+                    stage["stage"] for stage in metrics.get_stages()
+                ]
+                assert governor.get_utilisation()["egress"]["total_bytes"] == 0
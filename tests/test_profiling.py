@@ -0,0 +1,61 @@
+import csv
+import subprocess
+from pathlib import Path
+
+from hdx.utilities.path import temp_dir
+
+from hdx.scraper.chc_ucsb.profiling import ResourceSampler
+
+
+class TestProfiling:
+    def test_resource_sampler(self):
+        with temp_dir(
+            "TestCHD_UCSB_profiling",
+            delete_on_success=True,
+            delete_on_failure=False,
+        ) as tempdir:
+            scratch = Path(tempdir, "scratch")
+            scratch.mkdir()
+            sampler = ResourceSampler(str(scratch), interval=0.01)
+            sample = sampler.sample()
+            assert sample["scratch_bytes"] == 0
+            assert sample["rss_bytes"] > 0
+            assert sample["open_fds"] > 0
+            assert sample["units"] == ""
+
+            process = subprocess.Popen(["sleep", "5"])
+            try:
+                with sampler.unit("Tmax", "2030_SSP245", "cnt_Tmaxgt30C", 1):
+                    scratch.joinpath("a.tif").write_bytes(bytes(1000))
+                    sample = sampler.sample()
+            finally:
+                process.kill()
+                process.wait()
+            assert sample["scratch_bytes"] == 1000
+            assert sample["subprocesses"] >= 1
+            assert sample["units"] == "Tmax/2030_SSP245/cnt_Tmaxgt30C/01"
+            assert sampler.get_peaks()["scratch_bytes"] == {
+                "value": 1000,
+                "units": "Tmax/2030_SSP245/cnt_Tmaxgt30C/01",
+            }
+
+            with sampler:
+                pass
+            assert len(sampler.get_samples()) >= 3
+
+            csv_path = Path(tempdir, "resources.csv")
+            sampler.save_csv(str(csv_path))
+            with open(csv_path) as f:
+                rows = list(csv.DictReader(f))
+            assert len(rows) == len(sampler.get_samples())
+            assert rows[1]["units"] == "Tmax/2030_SSP245/cnt_Tmaxgt30C/01"
+
+            prometheus_path = Path(tempdir, "resources.prom")
+            sampler.save_prometheus(str(prometheus_path))
+            text = prometheus_path.read_text()
+            assert "# TYPE chc_ucsb_scratch_bytes gauge" in text
+            assert (
+                'chc_ucsb_scratch_bytes{stat="peak",units="Tmax/2030_SSP245/cnt_Tmaxgt30C/01"} 1000'
+                in text
+            )
+            assert 'chc_ucsb_scratch_bytes{stat="last"} 1000' in text
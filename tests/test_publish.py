@@ -0,0 +1,81 @@
+from unittest.mock import patch
+
+import pytest
+from hdx.data.dataset import Dataset
+
+from hdx.scraper.chc_ucsb.publish import diff_dataset_metadata, finalise_resources
+
+
+class TestPublish:
+    def test_diff_dataset_metadata(self, configuration):
+        dataset = Dataset(
+            {
+                "name": "chc_ucsb_tmax_2030_ssp245",
+                "title": "Title",
+                "caveats": None,
+                "private": False,
+                "data_update_frequency": -1,
+                "subnational": "0",
+                "tags": [{"name": "environment"}, {"name": "climate-weather"}],
+                "groups": [{"name": "world"}],
+            }
+        )
+        assert diff_dataset_metadata(dataset, None)["title"] == (None, "Title")
+        live_dataset = Dataset(
+            {
+                "id": "1234",
+                "name": "chc_ucsb_tmax_2030_ssp245",
+                "title": "Title",
+                "caveats": "",
+                "private": False,
+                "data_update_frequency": "-1",
+                "subnational": "0",
+                "tags": [
+                    {"name": "climate-weather", "vocabulary_id": "5678"},
+                    {"name": "environment", "vocabulary_id": "5678"},
+                ],
+                "groups": [{"name": "world", "id": "world"}],
+                "num_resources": 60,
+            }
+        )
+        assert diff_dataset_metadata(dataset, live_dataset) == {}
+        live_dataset["title"] = "Old Title"
+        live_dataset["tags"] = [{"name": "environment"}]
+        assert diff_dataset_metadata(dataset, live_dataset) == {
+            "title": ("Old Title", "Title"),
+            "tags": (
+                [{"name": "environment"}],
+                [{"name": "environment"}, {"name": "climate-weather"}],
+            ),
+        }
+
+    def test_finalise_resources(self, configuration):
+        live_dataset = Dataset({"id": "1234", "name": "test"})
+        live_dataset.add_update_resources(
+            [
+                {"id": "b", "name": "b", "format": "geotiff"},
+                {"id": "a", "name": "a", "format": "geotiff"},
+            ]
+        )
+        with patch.object(Dataset, "read_from_hdx") as read_from_hdx:
+            assert finalise_resources("test", ["a"], True, ["a"], "test", "") == 0
+            read_from_hdx.assert_not_called()
+
+            read_from_hdx.return_value = live_dataset
+            with patch.object(Dataset, "reorder_resources") as reorder_resources:
+                writes = finalise_resources("test", ["a", "b"], True, None, "test", "")
+                assert writes == 1
+                reorder_resources.assert_called_once_with(["a", "b"])
+
+            # Resources missing from HDX fail rather than publish an incomplete
+            # dataset
+            with patch.object(Dataset, "create_in_hdx") as create_in_hdx:
+                with pytest.raises(ValueError):
+                    finalise_resources("test", ["a", "c"], True, None, "test", "")
+                create_in_hdx.assert_not_called()
+
+            with patch.object(Dataset, "create_in_hdx") as create_in_hdx:
+                writes = finalise_resources("test", ["a"], True, None, "test", "")
+                assert writes == 1
+                create_in_hdx.assert_called_once()
+                assert [r["id"] for r in live_dataset.get_resources()] == ["a"]
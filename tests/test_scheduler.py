@@ -0,0 +1,114 @@
+from os.path import join
+
+import pytest
+from hdx.utilities.path import temp_dir
+
+from hdx.scraper.chc_ucsb.report import RunReport
+from hdx.scraper.chc_ucsb.scheduler import Scheduler, load_previous_report
+from hdx.scraper.chc_ucsb.work_graph import WorkGraph
+
+
+class TestScheduler:
+    units = [
+        ("cnt_Tmaxgt30C", 1),
+        ("cnt_Tmaxgt30C", 2),
+        ("monthly_mean", 1),
+        ("monthly_mean", 2),
+    ]
+
+    @pytest.fixture(scope="class")
+    def work_graph(self, configuration):
+        return WorkGraph(configuration)
+
+    @pytest.fixture(scope="class")
+    def my_tiff_download(self):
+        class MyTIFFDownload:
+            sources = []
+
+            def list_sizes(self, source: str):
+                self.sources.append(source)
+                month = int(source[-2:])
+                return {
+                    f"Daily_Tmax_1983_{month:02d}_cnt_Tmaxgt30C.tif": 10,
+                    f"Daily_Tmax_1984_{month:02d}_cnt_Tmaxgt30C.tif": 10,
+                    f"Daily_Tmax_1983_{month:02d}_monthly_mean.tif": 100 * month,
+                }
+
+        return MyTIFFDownload()
+
+    def test_report_costs(self, work_graph, my_tiff_download):
+        previous_report = RunReport()
+        for unit_index, (product, month) in enumerate(self.units):
+            size = 5 if unit_index == 1 else unit_index
+            previous_report.add_unit(
+                "Tmax",
+                "2030_SSP245",
+                unit_index,
+                product,
+                month,
+                [{"name": "a", "id": "a", "size": size, "hash": "x"}],
+            )
+        scheduler = Scheduler(my_tiff_download, work_graph, "report", previous_report)
+        assert scheduler.order("Tmax", "2030_SSP245", self.units) == [
+            ("cnt_Tmaxgt30C", 2),
+            ("monthly_mean", 2),
+            ("monthly_mean", 1),
+            ("cnt_Tmaxgt30C", 1),
+        ]
+        # No previous costs keeps canonical order
+        assert scheduler.order("Tmax", "2050_SSP245", self.units) == self.units
+        scheduler = Scheduler(my_tiff_download, work_graph, "report", None)
+        assert scheduler.order("Tmax", "2030_SSP245", self.units) == self.units
+
+    def test_listing_costs(self, work_graph, my_tiff_download):
+        scheduler = Scheduler(my_tiff_download, work_graph, "listing")
+        assert scheduler.get_costs("Tmax", "2030_SSP245", self.units) == {
+            ("cnt_Tmaxgt30C", 1): 20,
+            ("cnt_Tmaxgt30C", 2): 20,
+            ("monthly_mean", 1): 100,
+            ("monthly_mean", 2): 200,
+        }
+        assert my_tiff_download.sources == [
+            "reflection.grit.ucsb.edu::CHC_CMIP6/extremes/Tmax/2030_SSP245/01",
+            "reflection.grit.ucsb.edu::CHC_CMIP6/extremes/Tmax/2030_SSP245/02",
+        ]
+        assert scheduler.order("Tmax", "2030_SSP245", self.units) == [
+            ("monthly_mean", 2),
+            ("monthly_mean", 1),
+            ("cnt_Tmaxgt30C", 1),
+            ("cnt_Tmaxgt30C", 2),
+        ]
+
+    def test_unknown_cost_source(self, work_graph, my_tiff_download):
+        with pytest.raises(ValueError):
+            Scheduler(my_tiff_download, work_graph, "guess")
+
+    def test_load_previous_report(self):
+        with temp_dir(
+            "TestCHD_UCSB_previous_report",
+            delete_on_success=True,
+            delete_on_failure=False,
+        ) as tempdir:
+            assert load_previous_report(tempdir) is None
+            for shard_index, product in enumerate(("cnt_Tmaxgt30C", "monthly_mean")):
+                report = RunReport(shard_index, 2)
+                report.add_unit(
+                    "Tmax",
+                    "2030_SSP245",
+                    shard_index,
+                    product,
+                    1,
+                    [{"name": product, "id": product, "size": 1, "hash": "x"}],
+                )
+                report.set_compression(
+                    "Tmax", product, {"policy": "auto", "method": "store"}
+                )
+                report.save(join(tempdir, f"shard_{shard_index}_of_2.json"))
+            previous_report = load_previous_report(tempdir)
+        assert len(previous_report.get_units("Tmax", "2030_SSP245")) == 2
+        assert previous_report.data["compression"] == {
+            "Tmax": {
+                "cnt_Tmaxgt30C": {"policy": "auto", "method": "store"},
+                "monthly_mean": {"policy": "auto", "method": "store"},
+            }
+        }
@@ -0,0 +1,89 @@
+from os.path import join
+
+import pytest
+from hdx.utilities.path import temp_dir
+
+from hdx.scraper.chc_ucsb.report import RunReport
+from hdx.scraper.chc_ucsb.shards import (
+    get_shard_report_path,
+    merge_shard_reports,
+    shard_units,
+)
+from hdx.scraper.chc_ucsb.work_graph import WorkGraph
+
+
+class TestShards:
+    variable_configuration = {
+        "base_url": "server::CHC_CMIP6/extremes/Tmax",
+        "dataset_name": "chc_ucsb_tmax_{scenario_lower}",
+        "dataset_title": "Title {scenario_print}",
+        "dataset_description": "Description {scenario_print}",
+        "resource_description": "Description {product} {month_name}",
+        "zip_file": "Daily_Tmax_{product}_{month}.zip",
+        "scenarios": ["2030_SSP245", "2050_SSP245"],
+        "products": ["cnt_Tmaxgt30C", "monthly_mean"],
+        "months": [1, 2],
+    }
+    units = [
+        ("cnt_Tmaxgt30C", 1),
+        ("cnt_Tmaxgt30C", 2),
+        ("monthly_mean", 1),
+        ("monthly_mean", 2),
+    ]
+
+    @pytest.fixture(scope="class")
+    def work_graph(self):
+        return WorkGraph({"variables": {"Tmax": self.variable_configuration}})
+
+    def test_shard_units(self, work_graph):
+        assert shard_units(work_graph, 0, 1) == {
+            ("Tmax", "2030_SSP245"): self.units,
+            ("Tmax", "2050_SSP245"): self.units,
+        }
+        # Whole datasets are assigned to shards
+        shards = [shard_units(work_graph, i, 3) for i in range(3)]
+        assert shards == [
+            {("Tmax", "2030_SSP245"): self.units},
+            {("Tmax", "2050_SSP245"): self.units},
+            {},
+        ]
+        with pytest.raises(ValueError):
+            shard_units(work_graph, 3, 3)
+
+    def test_merge_shard_reports(self, work_graph):
+        with temp_dir(
+            "TestCHD_UCSB_shards",
+            delete_on_success=True,
+            delete_on_failure=False,
+        ) as tempdir:
+            for shard_index in range(3):
+                report = RunReport(shard_index, 3)
+                shard = shard_units(work_graph, shard_index, 3)
+                for (variable, scenario), units in shard.items():
+                    for product, month in reversed(units):
+                        unit_index = self.units.index((product, month))
+                        name = f"{scenario}_{unit_index}"
+                        report.add_unit(
+                            variable,
+                            scenario,
+                            unit_index,
+                            product,
+                            month,
+                            [{"name": name, "id": name, "size": 1, "hash": "x"}],
+                        )
+                report.save(get_shard_report_path(tempdir, shard_index, 3))
+            assert merge_shard_reports(tempdir, work_graph) == {
+                ("Tmax", "2030_SSP245"): [f"2030_SSP245_{i}" for i in range(4)],
+                ("Tmax", "2050_SSP245"): [f"2050_SSP245_{i}" for i in range(4)],
+            }
+            extra_graph = WorkGraph(
+                {
+                    "variables": {
+                        "Tmax": {**self.variable_configuration, "months": [1, 2, 3]}
+                    }
+                }
+            )
+            with pytest.raises(ValueError):
+                merge_shard_reports(tempdir, extra_graph)
+            with pytest.raises(ValueError):
+                merge_shard_reports(join(tempdir, "missing"), work_graph)
@@ -0,0 +1,69 @@
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+from hdx.utilities.path import temp_dir
+
+from hdx.scraper.chc_ucsb.staging import link_files, link_or_copy
+
+
+class TestStaging:
+    def test_link_or_copy(self):
+        with temp_dir(
+            "TestCHD_UCSB_staging",
+            delete_on_success=True,
+            delete_on_failure=False,
+        ) as tempdir:
+            source = Path(tempdir, "a.tif")
+            source.write_bytes(b"1234")
+            os.utime(source, ns=(0, 1000))
+
+            destination = Path(tempdir, "hardlink.tif")
+            assert link_or_copy(source, destination) == "hardlink"
+            assert destination.stat().st_ino == source.stat().st_ino
+
+            destination = Path(tempdir, "reflink.tif")
+            with (
+                patch("os.link", side_effect=OSError),
+                patch("fcntl.ioctl") as ioctl,
+            ):
+                assert link_or_copy(source, destination) == "reflink"
+            ioctl.assert_called_once()
+            assert destination.stat().st_mtime_ns == 1000
+
+            destination = Path(tempdir, "copy.tif")
+            with (
+                patch("os.link", side_effect=OSError),
+                patch("fcntl.ioctl", side_effect=OSError),
+            ):
+                assert link_or_copy(source, destination) == "copy"
+            assert destination.read_bytes() == b"1234"
+            assert destination.stat().st_ino != source.stat().st_ino
+            assert destination.stat().st_mtime_ns == 1000
+
+    def test_link_files(self):
+        with temp_dir(
+            "TestCHD_UCSB_link_files",
+            delete_on_success=True,
+            delete_on_failure=False,
+        ) as tempdir:
+            mirror = Path(tempdir, "mirror")
+            mirror.mkdir()
+            for name in (
+                "Daily_Tmax_1983_01_cnt_Tmaxgt30C.tif",
+                "Daily_Tmax_1984_01_cnt_Tmaxgt30C.tif",
+                "Daily_Tmax_1983_01_monthly_mean.tif",
+            ):
+                mirror.joinpath(name).write_bytes(name.encode())
+            tif_directory = Path(tempdir, "cnt_Tmaxgt30C", "01")
+            assert link_files(mirror, tif_directory, "*cnt_Tmaxgt30C*") == {
+                "hardlink": 2
+            }
+            # Staging again replaces the staged files
+            assert link_files(mirror, tif_directory, "*cnt_Tmaxgt30C*") == {
+                "hardlink": 2
+            }
+            assert sorted(x.name for x in tif_directory.iterdir()) == [
+                "Daily_Tmax_1983_01_cnt_Tmaxgt30C.tif",
+                "Daily_Tmax_1984_01_cnt_Tmaxgt30C.tif",
+            ]
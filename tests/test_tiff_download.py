@@ -5,6 +5,7 @@ from unittest.mock import AsyncMock, patch
 
 import pytest
 
+from hdx.scraper.chc_ucsb.bandwidth import BandwidthGovernor
 from hdx.scraper.chc_ucsb.tiff_download import TIFFDownload
 
 
@@ -72,3 +73,151 @@ class TestTIFFDownload:
 
             # C. Check log calls
             assert "rsync: some minor warning" in caplog.text
+
+    @patch("asyncio.create_subprocess_exec")
+    def test_list_sizes(self, mock_create_subprocess_exec):
+        tiff_download = TIFFDownload()
+        stdout_lines = [
+            b"drwxr-xr-x          4,096 2023/05/01 10:00:00 .\n",
+            b"-rw-r--r--     25,921,034 2023/05/01 10:00:00 Daily_Tmax_1983_01_cnt_Tmaxgt30C.tif\n",
+            b"-rw-r--r--        921,034 2023/05/01 10:00:00 Daily_Tmax_1983_01_monthly_mean.tif\n",
+        ]
+        mock_stdout_stream = AsyncMock()
+        mock_stdout_stream.__aiter__.return_value = iter(stdout_lines)
+        mock_stderr_stream = AsyncMock()
+        mock_stderr_stream.__aiter__.return_value = iter([])
+        mock_create_subprocess_exec.return_value = AsyncMock(
+            stdout=mock_stdout_stream,
+            stderr=mock_stderr_stream,
+            wait=AsyncMock(return_value=0),
+        )
+
+        sizes = tiff_download.list_sizes("/src")
+
+        mock_create_subprocess_exec.assert_called_once_with(
+            "rsync",
+            "--list-only",
+            "/src/",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        assert sizes == {
+            "Daily_Tmax_1983_01_cnt_Tmaxgt30C.tif": 25921034,
+            "Daily_Tmax_1983_01_monthly_mean.tif": 921034,
+        }
+
+    @patch("asyncio.create_subprocess_exec")
+    def test_process_bwlimit(self, mock_create_subprocess_exec):
+        governor = BandwidthGovernor(ingress_rate=2 * 1024 * 1024, max_transfers=2)
+        tiff_download = TIFFDownload(governor)
+        mock_stdout_stream = AsyncMock()
+        mock_stdout_stream.__aiter__.return_value = iter(
+            [
+                b"Daily_Tmax_1983_01_cnt_Tmaxgt30C.tif\n",
+                b"Daily_Tmax_1984_01_cnt_Tmaxgt30C.tif is uptodate\n",
+            ]
+        )
+        mock_stderr_stream = AsyncMock()
+        mock_stderr_stream.__aiter__.return_value = iter([])
+        mock_create_subprocess_exec.return_value = AsyncMock(
+            stdout=mock_stdout_stream,
+            stderr=mock_stderr_stream,
+            wait=AsyncMock(return_value=0),
+        )
+
+        results = tiff_download.process("/src", Path("/dst"), "*.tif")
+        # Files already up to date are not transferred
+        assert results == ["Daily_Tmax_1983_01_cnt_Tmaxgt30C.tif"]
+
+        mock_create_subprocess_exec.assert_called_once_with(
+            "rsync",
+            "-avv",
+            "--include=*.tif",
+            "--exclude=*",
+            "--bwlimit=1024",
+            "/src/",
+            "/dst/",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        # Downloaded bytes are charged to the governor by the caller
+        assert governor.get_utilisation()["ingress"]["total_bytes"] == 0
+
+    @patch("asyncio.create_subprocess_exec")
+    def test_process_delete(self, mock_create_subprocess_exec):
+        tiff_download = TIFFDownload()
+        mock_stdout_stream = AsyncMock()
+        mock_stdout_stream.__aiter__.return_value = iter(
+            [
+                b"deleting Daily_Tmax_1982_01_cnt_Tmaxgt30C.tif\n",
+                b"Daily_Tmax_1983_01_cnt_Tmaxgt30C.tif\n",
+            ]
+        )
+        mock_stderr_stream = AsyncMock()
+        mock_stderr_stream.__aiter__.return_value = iter([])
+        mock_create_subprocess_exec.return_value = AsyncMock(
+            stdout=mock_stdout_stream,
+            stderr=mock_stderr_stream,
+            wait=AsyncMock(return_value=0),
+        )
+
+        results = tiff_download.process("/src", Path("/dst"), "*.tif", delete=True)
+        # Deleted files are not transferred
+        assert results == ["Daily_Tmax_1983_01_cnt_Tmaxgt30C.tif"]
+
+        mock_create_subprocess_exec.assert_called_once_with(
+            "rsync",
+            "-avv",
+            "--include=*.tif",
+            "--exclude=*",
+            "--delete",
+            "/src/",
+            "/dst/",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+
+    @patch("asyncio.create_subprocess_exec")
+    def test_process_summary(self, mock_create_subprocess_exec, caplog):
+        stdout_lines = [f"line {i}\n".encode() for i in range(100)] + [
+            b"Daily_Tmax_1983_01_cnt_Tmaxgt30C.tif\n",
+            b"sent 1,234 bytes  received 25,921,034 bytes  1,234.00 bytes/sec\n",
+        ]
+
+        def mock_process(returncode):
+            mock_stdout_stream = AsyncMock()
+            mock_stdout_stream.__aiter__.return_value = iter(stdout_lines)
+            mock_stderr_stream = AsyncMock()
+            mock_stderr_stream.__aiter__.return_value = iter([])
+            return AsyncMock(
+                stdout=mock_stdout_stream,
+                stderr=mock_stderr_stream,
+                wait=AsyncMock(return_value=returncode),
+            )
+
+        tiff_download = TIFFDownload(log_mode="summary", buffer_lines=10, tail_lines=3)
+        mock_create_subprocess_exec.return_value = mock_process(0)
+        with caplog.at_level(logging.INFO):
+            results = tiff_download.process("/src", Path("/dst"), "*.tif")
+        assert results == ["Daily_Tmax_1983_01_cnt_Tmaxgt30C.tif"]
+        assert "line 50" not in caplog.text
+        assert (
+            "rsync /src: 1 tifs, 102 lines of output. sent 1,234 bytes  received 25,921,034 bytes"
+            in caplog.text
+        )
+
+        caplog.clear()
+        mock_create_subprocess_exec.return_value = mock_process(23)
+        with caplog.at_level(logging.INFO):
+            tiff_download.process("/src", Path("/dst"), "*.tif")
+        errors = [
+            record.getMessage()
+            for record in caplog.records
+            if record.levelno == logging.ERROR
+        ]
+        assert errors == [
+            "rsync /src failed with exit code 23. Last 3 of 102 lines:",
+            "line 99",
+            "Daily_Tmax_1983_01_cnt_Tmaxgt30C.tif",
+            "sent 1,234 bytes  received 25,921,034 bytes  1,234.00 bytes/sec",
+        ]
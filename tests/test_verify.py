@@ -0,0 +1,81 @@
+from os.path import join
+
+from hdx.api.configuration import Configuration
+from hdx.data.resource import Resource
+from hdx.utilities.path import temp_dir
+
+from hdx.scraper.chc_ucsb.fake_hdx import FakeHDX
+from hdx.scraper.chc_ucsb.pipeline import Pipeline
+from hdx.scraper.chc_ucsb.report import RunReport
+from hdx.scraper.chc_ucsb.verify import ResourceVerifier, get_failed_units
+
+
+class TestVerify:
+    def test_verify(self, configuration, config_dir):
+        with temp_dir(
+            "TestCHD_UCSB_verify",
+            delete_on_success=True,
+            delete_on_failure=False,
+        ) as tempdir:
+            with FakeHDX() as fake_hdx:
+                Configuration._create(
+                    user_agent="test",
+                    hdx_url=fake_hdx.url,
+                    hdx_key="fake",
+                    project_config_yaml=join(config_dir, "project_configuration.yaml"),
+                )
+                try:
+                    remoteckan = Configuration.read().remoteckan()
+                    package = remoteckan.call_action(
+                        "package_create", {"name": "test", "resources": []}
+                    )
+                    report = RunReport()
+                    for month in range(1, 4):
+                        path = join(tempdir, f"test_{month:02d}.tif")
+                        with open(path, "wb") as f:
+                            f.write(bytes([month]) * 1000)
+                        resource = Resource(
+                            {
+                                "name": f"test_{month:02d}.tif",
+                                "description": "test",
+                                "package_id": package["id"],
+                            }
+                        )
+                        resource.set_format("geotiff")
+                        resource.set_file_to_upload(path)
+                        checksums = Pipeline.get_checksums([(resource, path)])
+                        resource.create_in_hdx()
+                        report.add_unit(
+                            "Tmax",
+                            "2030_SSP245",
+                            month - 1,
+                            "cnt_Tmaxgt30C",
+                            month,
+                            [resource],
+                            checksums,
+                        )
+                    units = report.get_units("Tmax", "2030_SSP245")
+                    verifier = ResourceVerifier(max_workers=4)
+                    assert verifier.verify(units) == []
+
+                    ids = [unit["resources"][0]["id"] for unit in units]
+                    remoteckan.call_action(
+                        "resource_patch", {"id": ids[2], "hash": "corrupt"}
+                    )
+                    remoteckan.call_action("resource_delete", {"id": ids[0]})
+                    failures = verifier.verify(units)
+                finally:
+                    Configuration._configuration = configuration
+            assert [failure["problem"] for failure in failures] == [
+                "missing",
+                "mismatch",
+            ]
+            assert failures[1]["changes"]["hash"][1] == "corrupt"
+            assert get_failed_units(failures) == [
+                ("cnt_Tmaxgt30C", 1),
+                ("cnt_Tmaxgt30C", 3),
+            ]
+            assert (
+                get_failed_units([{**failures[0], "problem": "error", "error": "x"}])
+                == []
+            )
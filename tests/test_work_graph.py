@@ -0,0 +1,28 @@
+import pytest
+
+from hdx.scraper.chc_ucsb.work_graph import WorkGraph
+
+
+class TestWorkGraph:
+    def test_work_graph(self, configuration):
+        work_graph = WorkGraph(configuration)
+        assert work_graph.get_variables() == ["Tmax"]
+        datasets = work_graph.get_datasets()
+        assert datasets == [
+            ("Tmax", "2030_SSP245"),
+            ("Tmax", "2050_SSP245"),
+            ("Tmax", "2030_SSP585"),
+            ("Tmax", "2050_SSP585"),
+        ]
+        units = work_graph.get_units("Tmax")
+        assert len(units) == 60
+        assert units[:2] == [("cnt_Tmaxgt30C", 1), ("cnt_Tmaxgt30C", 2)]
+        assert units[-1] == ("monthly_mean", 12)
+        assert (
+            work_graph.get_variable_configuration("Tmax")["zip_file"]
+            == "Daily_Tmax_{product}_{month}.zip"
+        )
+
+    def test_missing_configuration(self):
+        with pytest.raises(ValueError):
+            WorkGraph({"variables": {"Tmin": {"base_url": "server::Tmin"}}})